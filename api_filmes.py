@@ -1,309 +1,3102 @@
 import json
-from flask import Flask, jsonify, request, redirect, Response
+import os
+import sys
+import mmap
+import struct
+import bisect
+from flask import Flask, jsonify, request, redirect, Response, g, has_request_context
 from unidecode import unidecode
 from functools import wraps
-from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadTimeSignature 
+from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESSIV
 import time
 from urllib.parse import unquote 
 import requests 
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import HTTPError as ErroUrllib3
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib.parse import urlsplit, urljoin, quote
+import heapq
+import re
+import gzip
+import hashlib
+import hmac
+import threading
+import base64
+import math
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import brotli
+except ImportError:  # Brotli é opcional: sem ele servimos apenas gzip/identity
+    brotli = None
+
+try:
+    import redis
+except ImportError:  # Redis é opcional: sem ele os limites por token ficam na memória de cada processo
+    redis = None
+
+try:
+    import fcntl
+except ImportError:  # fcntl só existe em Unix: sem ele cada processo roda a própria sonda de links
+    fcntl = None
 
 # --- Variáveis Globais de Segurança e Configuração ---
 
-app = Flask(__name__) 
+app = Flask(__name__) 
+
+# TEMPO DE EXPIRAÇÃO DO LINK: 4 horas = 4 * 3600 = 14400 segundos
+TEMPO_EXPIRACAO_LINK = 14400 
+
+# CHAVE SECRETA para assinar/validar links temporários. Mude este valor!
+SECRET_KEY_ASSINATURA = "sua_chave_secreta_para_assinatura_de_links_XYZ"
+
+signer = URLSafeTimedSerializer(SECRET_KEY_ASSINATURA, salt='media-access-salt')
+
+# Defina o caractere que separa os gêneros no seu 'filmes_capturados.json'
+SPLIT_CHAR = ',' 
+# ------------------------------------------------------------------------
+
+# Nomes dos arquivos de dados
+DATA_FILE = 'filmes_capturados.json'
+TOKENS_FILE = 'api_tokens.json'
+# Snapshot binário gerado offline por build_snapshot.py (opcional)
+BINARY_FILE = 'filmes_capturados.bin'
+# Formato do catálogo na inicialização: 'auto' (binário se estiver em dia), 'json' ou 'bin'
+CATALOGO_FORMATO = os.environ.get('CATALOGO_FORMATO', 'auto')
+
+# --- Funções Auxiliares de Dados e Autenticação ---
+
+def load_data():
+    """Carrega os dados dos filmes e categorias e calcula a versão (hash) do arquivo."""
+    try:
+        with open(DATA_FILE, 'rb') as f:
+            conteudo = f.read()
+        data = json.loads(conteudo)
+        filmes = [filme for filme in data['filmes'] if isinstance(filme, dict)]
+        categorias = [cat for cat in data['categorias_capturadas'] if isinstance(cat, str)]
+        descartados = len(data['filmes']) - len(filmes) + len(data['categorias_capturadas']) - len(categorias)
+        if descartados:
+            print(f"AVISO: {descartados} itens de {DATA_FILE} ignorados (filme que não é objeto ou categoria que não é texto).")
+        return filmes, categorias, hashlib.sha1(conteudo).hexdigest()
+    except Exception as e:
+        print(f"ERRO: Falha ao carregar {DATA_FILE}: {e}")
+        return [], [], 'vazio'
+
+def file_signature(caminho: str):
+    """(mtime, tamanho) do arquivo, ou None se ele não existir."""
+    try:
+        st = os.stat(caminho)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+def load_tokens():
+    """Carrega os tokens válidos do arquivo JSON (tokens de acesso à API)."""
+    try:
+        with open(TOKENS_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return set(data.get('valid_tokens', [])) 
+    except Exception:
+        return set()
+
+def load_token_limits() -> dict:
+    """Bloco "limites" do arquivo de tokens: {"padrao": {...}, "<token>": {...}} (vazio se ausente)."""
+    try:
+        with open(TOKENS_FILE, 'r', encoding='utf-8') as f:
+            limites = json.load(f).get('limites', {})
+        return limites if isinstance(limites, dict) else {}
+    except Exception:
+        return {}
+
+def filter_movie_data(movie: dict) -> dict:
+    """
+    Remove chaves sensíveis/internas (EXCETO url_m3u8_ou_mp4), LIMPA AS URLS, 
+    cria a chave 'tipo' baseada na URL, e converte o valor de 'generos' para MAIÚSCULO.
+    """
+    EXCLUDE_KEYS = ['url_player_pagina', 'url_filme']
+    URL_KEYS_TO_CLEAN = ['url_capa', 'url_poster'] 
+    
+    filtered_movie = movie.copy()
+    
+    # 1. Remove chaves sensíveis (url_m3u8_ou_mp4 é mantida)
+    for key in EXCLUDE_KEYS:
+        filtered_movie.pop(key, None)
+        
+    # 2. Limpa as aspas simples extras das URLs
+    for key in URL_KEYS_TO_CLEAN:
+        if key in filtered_movie and isinstance(filtered_movie[key], str):
+            # O método .strip("'") remove a aspa simples no início e no fim da string
+            filtered_movie[key] = filtered_movie[key].strip("'")
+            
+    # 3. Garante que o valor de 'generos' venha em MAIÚSCULO
+    if 'generos' in filtered_movie and isinstance(filtered_movie['generos'], str):
+        filtered_movie['generos'] = filtered_movie['generos'].upper()
+
+    # 4. [ÚLTIMA MODIFICAÇÃO] Cria a chave "tipo" baseada na URL de mídia
+    url_midia = text_field(filtered_movie, 'url_m3u8_ou_mp4').lower()
+    tipo = 'desconhecido'
+    
+    if url_midia:
+        if 'm3u8' in url_midia:
+            tipo = 'm3u8'
+        elif 'm3u' in url_midia:
+            tipo = 'm3u'
+        elif 'mp4' in url_midia:
+            tipo = 'mp4'
+        elif 'drive.google' in url_midia or 'driver' in url_midia:
+            tipo = 'driver' 
+    
+    # Adiciona a nova chave "tipo" ao objeto filtrado
+    filtered_movie['tipo'] = tipo
+            
+    return filtered_movie
+
+def text_field(filme: dict, campo: str) -> str:
+    """
+    Campo textual do filme raspado: strings como vieram, números como texto e
+    o resto (null, listas...) como ''. Um registro malformado não pode
+    derrubar a montagem do snapshot inteiro.
+    """
+    valor = filme.get(campo)
+    if isinstance(valor, str):
+        return valor
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return str(valor)
+    return ''
+
+def parse_views(valor) -> int:
+    """Converte o campo 'views' (ex: "8,990") em inteiro; 0 se ausente ou inválido."""
+    if isinstance(valor, int):
+        return valor
+    digitos = ''.join(c for c in str(valor or '') if c.isdigit())
+    return int(digitos) if digitos else 0
+
+_NOTA_IMDB = re.compile(r'\d+(?:[.,]\d+)?')
+
+def parse_imdb(valor):
+    """Converte o campo 'imdb' (ex: "IMDb7.5") em float; None se ausente ou inválido."""
+    nota = _NOTA_IMDB.search(str(valor or ''))
+    return float(nota.group().replace(',', '.')) if nota else None
+
+# Bits dos filme_ids estáveis: cabem com folga no inteiro exato do JavaScript (2^53)
+BITS_ID_FILME = 48
+
+def stable_film_key(filme: dict) -> str:
+    """Identidade do filme: a URL da página de origem ou, sem ela, título + ano normalizados."""
+    for campo in ('url_player_pagina', 'url_filme'):
+        valor = filme.get(campo)
+        if isinstance(valor, str) and valor.strip() and valor != 'N/A':
+            return valor.strip()
+    return f"{normalizar_texto(text_field(filme, 'titulo'))}|{str(filme.get('ano', '')).strip()}"
+
+def assign_stable_ids(filmes: list) -> list:
+    """
+    filme_id de cada filme (na ordem do catálogo): hash da identidade do filme,
+    então não depende da posição no arquivo e sobrevive a recargas e reinícios.
+    Colisões (e identidades repetidas) são desfeitas com um contador na chave,
+    na ordem do catálogo.
+    """
+    usados = set()
+    ids = []
+    for filme in filmes:
+        chave = stable_film_key(filme)
+        tentativa = 0
+        while True:
+            texto = f"{chave}#{tentativa}" if tentativa else chave
+            digest = hashlib.blake2b(texto.encode('utf-8'), digest_size=8).digest()
+            filme_id = int.from_bytes(digest, 'big') >> (64 - BITS_ID_FILME)
+            if filme_id not in usados:
+                break
+            tentativa += 1
+        usados.add(filme_id)
+        ids.append(filme_id)
+    return ids
+
+class FilmeRegistro:
+    """
+    Registro compacto de um filme do catálogo. Guarda o dicionário original
+    (usado pelo player/proxy), a visão pública já filtrada, com o 'filme_id'
+    estável, e os termos normalizados usados pelos índices.
+    """
+    __slots__ = ('filme_id', 'original', 'publico', 'views', 'imdb', 'titulo_norm', 'generos_norm', 'fragmento')
+
+    def __init__(self, filme_id: int, original: dict):
+        self.filme_id = filme_id
+        self.original = original
+        self.publico = filter_movie_data(original)
+        self.publico['filme_id'] = filme_id
+        self.views = parse_views(original.get('views'))
+        self.imdb = parse_imdb(original.get('imdb'))
+        self.titulo_norm = normalizar_texto(text_field(original, 'titulo'))
+        self.generos_norm = tuple(dict.fromkeys(
+            normalizar_texto(g) for g in text_field(original, 'generos').split(SPLIT_CHAR)
+        ))
+        self.fragmento = None
+
+    def fragmento_json(self) -> bytes:
+        """JSON da visão pública, codificado uma vez (sob demanda) para o modo streaming."""
+        if self.fragmento is None:
+            self.fragmento = app.json.dumps(self.publico, separators=(',', ':')).encode('utf-8')
+        return self.fragmento
+
+    def etag(self) -> str:
+        """ETag do conteúdo público do filme (independe da versão do catálogo)."""
+        return hashlib.sha1(self.fragmento_json()).hexdigest()[:32]
+
+def build_catalog(filmes: list, anterior: list = None) -> list:
+    """
+    Pré-calcula a visão pública de cada filme uma única vez, na carga dos dados.
+    Com o catálogo 'anterior', reaproveita os registros cujo filme não mudou
+    (mesmo filme_id e mesmo conteúdo, em qualquer posição): só os filmes
+    alterados ou novos são reprocessados. Só os registros são reaproveitados;
+    os índices são sempre remontados do zero pelo CatalogoSnapshot. De um
+    snapshot binário entram só os registros que ele já decodificou:
+    decodificar os demais do mmap só para compará-los custaria tanto quanto
+    reprocessá-los.
+    """
+    if isinstance(anterior, RegistrosMmap):
+        anterior = [registro for registro in anterior.cache if registro is not None]
+    anteriores = {registro.filme_id: registro for registro in anterior or []}
+    catalogo = []
+    for filme_id, filme in zip(assign_stable_ids(filmes), filmes):
+        registro = anteriores.get(filme_id)
+        if registro is None or registro.original != filme:
+            registro = FilmeRegistro(filme_id, filme)
+        catalogo.append(registro)
+    return catalogo
+
+def normalizar_texto(texto: str) -> str:
+    """Normalização usada nas buscas: sem acentos, sem espaços nas pontas e minúscula."""
+    return unidecode(texto).strip().lower()
+
+def build_genre_index(catalogo: list) -> dict:
+    """
+    Monta o índice invertido gênero normalizado -> lista de posições no
+    catálogo (em ordem crescente, sem repetições).
+    """
+    indice = {}
+    for posicao, registro in enumerate(catalogo):
+        for genero in registro.generos_norm:
+            indice.setdefault(genero, []).append(posicao)
+    return indice
+
+def build_year_index(catalogo: list) -> dict:
+    """Índice ano (sem espaços nas pontas) -> lista de posições, na ordem do catálogo."""
+    indice = {}
+    for posicao, registro in enumerate(catalogo):
+        indice.setdefault(text_field(registro.original, 'ano').strip(), []).append(posicao)
+    return indice
+
+def build_field_index(catalogo: list, campo: str) -> dict:
+    """Índice valor normalizado de um campo da visão pública (ex: 'tipo', 'classificacao') -> lista de posições."""
+    indice = {}
+    for posicao, registro in enumerate(catalogo):
+        valor = registro.publico.get(campo)
+        if isinstance(valor, str):
+            indice.setdefault(normalizar_texto(valor), []).append(posicao)
+    return indice
+
+def intersect_postings(listas: list) -> list:
+    """
+    Interseção de listas de posições em ordem crescente, começando pela menor:
+    cada posição que sobrou é procurada na próxima lista (busca binária, sempre
+    à frente do ponto anterior). Custa ~|menor| * log|maior|, sem montar sets.
+    """
+    listas = sorted(listas, key=len)
+    resultado = list(listas[0])
+    for lista in listas[1:]:
+        comuns = []
+        inicio = 0
+        for posicao in resultado:
+            inicio = bisect.bisect_left(lista, posicao, inicio)
+            if inicio == len(lista):
+                break
+            if lista[inicio] == posicao:
+                comuns.append(posicao)
+        resultado = comuns
+        if not resultado:
+            break
+    return resultado
+
+# Ordenações pré-calculadas (/top/<criterio>): atributos numéricos do registro, do
+# maior para o menor. Empates: mais views, depois ordem do catálogo. Filmes sem o
+# valor (ex: sem nota IMDb) ficam fora daquela ordem.
+CRITERIOS_ORDEM = ('views', 'imdb')
+
+def build_sorted_orders(catalogo: list) -> tuple:
+    """
+    (ordens, ordens_generos): para cada critério, as posições do maior para o
+    menor e, derivadas dessa ordem sem nova ordenação, as listas por gênero.
+    As rotas só fatiam essas listas.
+    """
+    ordens, ordens_generos = {}, {}
+    base = range(len(catalogo))
+    for criterio in CRITERIOS_ORDEM:
+        valores = [getattr(r, criterio) for r in catalogo]
+        # O sort é estável mesmo com reverse=True: empates mantêm a ordem de 'base'
+        ordem = sorted((i for i in base if valores[i] is not None), key=valores.__getitem__, reverse=True)
+        if criterio == 'views':
+            base = ordem
+        por_genero = {}
+        for posicao in ordem:
+            for genero in catalogo[posicao].generos_norm:
+                por_genero.setdefault(genero, []).append(posicao)
+        ordens[criterio] = ordem
+        ordens_generos[criterio] = por_genero
+    return ordens, ordens_generos
+
+def trigramas(texto: str) -> set:
+    """Conjunto de trigramas (substrings de 3 caracteres) de um texto."""
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+class IndiceTitulos:
+    """
+    Componente de busca por título: guarda os títulos já normalizados e um
+    índice invertido trigrama -> lista de posições. Uma busca parcial só
+    confere o 'in' nos filmes que têm todos os trigramas do termo.
+    """
+    __slots__ = ('titulos', 'views', 'postings')
+
+    # Níveis de relevância (menor = melhor)
+    EXATO, PREFIXO, INICIO_PALAVRA, SUBSTRING = range(4)
+
+    def __init__(self, catalogo: list):
+        self.titulos = [r.titulo_norm for r in catalogo]
+        self.views = [r.views for r in catalogo]
+        self.postings = {}
+        for posicao, titulo in enumerate(self.titulos):
+            for tri in trigramas(titulo):
+                self.postings.setdefault(tri, []).append(posicao)
+
+    @classmethod
+    def from_parts(cls, titulos, views, postings) -> 'IndiceTitulos':
+        """Monta o índice a partir de partes já prontas (ex: do snapshot binário)."""
+        indice = cls.__new__(cls)
+        indice.titulos = titulos
+        indice.views = views
+        indice.postings = postings
+        return indice
+
+    @staticmethod
+    def normalizar_consulta(titulo_busca: str) -> str:
+        """Mesma normalização das rotas de título: sem acentos, minúscula, '+' vira espaço."""
+        return normalizar_texto(unquote(titulo_busca)).replace('+', ' ')
+
+    def candidatos(self, termo: str):
+        """Posições (em ordem crescente) que podem conter o termo."""
+        if len(termo) < 3:
+            return range(len(self.titulos))
+
+        listas = []
+        for tri in trigramas(termo):
+            lista = self.postings.get(tri)
+            if lista is None:
+                return []
+            listas.append(lista)
+        listas.sort(key=len)
+
+        comuns = set(listas[0])
+        for lista in listas[1:]:
+            comuns.intersection_update(lista)
+            if not comuns:
+                return []
+        return sorted(comuns)
+
+    def buscar(self, termo: str, limite: int = None) -> list:
+        """Posições dos filmes cujo título normalizado contém o termo, na ordem do catálogo."""
+        resultados = []
+        for posicao in self.candidatos(termo):
+            if termo in self.titulos[posicao]:
+                resultados.append(posicao)
+                if limite and len(resultados) >= limite:
+                    break
+        return resultados
+
+    def relevancia(self, titulo: str, termo: str, inicio_palavra) -> int:
+        """Exato > prefixo > início de palavra > substring."""
+        if titulo == termo:
+            return self.EXATO
+        if titulo.startswith(termo):
+            return self.PREFIXO
+        if inicio_palavra.search(titulo):
+            return self.INICIO_PALAVRA
+        return self.SUBSTRING
+
+    def buscar_ranqueado(self, termo: str, limite: int = None, filtro=None) -> tuple:
+        """
+        (posições, total): filmes que contêm o termo, ordenados por relevância
+        e, no empate, por popularidade ('views'). Com 'limite', os top-k saem de
+        um heap limitado (heapq.nsmallest) em vez de uma ordenação completa;
+        'total' é sempre o número de filmes encontrados. 'filtro' (posições
+        em ordem crescente) restringe a busca a esses filmes.
+        """
+        candidatos = self.candidatos(termo)
+        if filtro is not None:
+            candidatos = filtro if len(termo) < 3 else intersect_postings([filtro, candidatos])
+        inicio_palavra = re.compile(r'(?<![a-z0-9])' + re.escape(termo))
+        chaves = [
+            (self.relevancia(self.titulos[posicao], termo, inicio_palavra), -self.views[posicao], posicao)
+            for posicao in candidatos
+            if termo in self.titulos[posicao]
+        ]
+        if limite:
+            ordenadas = heapq.nsmallest(limite, chaves)
+        else:
+            ordenadas = sorted(chaves)
+        return [posicao for _, _, posicao in ordenadas], len(chaves)
+
+class CatalogoSnapshot:
+    """
+    Versão imutável do catálogo com todos os índices derivados. Uma recarga
+    monta um snapshot novo e troca a referência global de uma vez só, então
+    cada requisição enxerga sempre um catálogo consistente. Os índices guardam
+    posições em 'registros'; 'posicoes' leva do filme_id estável à posição.
+    Numa recarga, 'anterior' só poupa o pré-cálculo dos registros que não
+    mudaram (ver build_catalog); títulos, ordens e postings são remontados.
+    """
+    __slots__ = ('versao', 'categorias', 'categorias_norm', 'registros', 'indice_generos',
+                 'indice_anos', 'indice_tipos', 'indice_classificacoes', 'indice_titulos',
+                 'ordens', 'ordens_generos', 'posicoes', 'mapa')
+
+    def __init__(self, filmes: list, categorias: list, versao: str, anterior=None):
+        self.versao = versao
+        self.categorias = categorias
+        self.categorias_norm = {
+            normalizar_texto(cat): cat
+            for cat in categorias
+        }
+        self.registros = build_catalog(filmes, anterior.registros if anterior else None)
+        self.indice_generos = build_genre_index(self.registros)
+        self.indice_anos = build_year_index(self.registros)
+        self.indice_tipos = build_field_index(self.registros, 'tipo')
+        self.indice_classificacoes = build_field_index(self.registros, 'classificacao')
+        self.indice_titulos = IndiceTitulos(self.registros)
+        self.ordens, self.ordens_generos = build_sorted_orders(self.registros)
+        self.posicoes = {registro.filme_id: posicao for posicao, registro in enumerate(self.registros)}
+        self.mapa = None
+
+    @classmethod
+    def from_binary(cls, caminho: str) -> 'CatalogoSnapshot':
+        """
+        Abre o snapshot binário com mmap. Nada é decodificado aqui: registros,
+        títulos e listas de postings são lidos do mapa sob demanda.
+        """
+        with open(caminho, 'rb') as f:
+            mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        secoes, versao = read_binary_sections(mapa)
+
+        snap = cls.__new__(cls)
+        snap.versao = versao
+        snap.categorias = json.loads(bytes(secoes['categorias']))
+        snap.categorias_norm = {
+            normalizar_texto(cat): cat
+            for cat in snap.categorias
+        }
+        snap.registros = RegistrosMmap(TabelaStrings(secoes['filmes']), secoes['ids'].cast('Q'))
+        snap.indice_generos = PostingsMmap.from_sections(secoes, 'generos')
+        snap.indice_anos = PostingsMmap.from_sections(secoes, 'anos')
+        snap.indice_tipos = PostingsMmap.from_sections(secoes, 'tipos')
+        snap.indice_classificacoes = PostingsMmap.from_sections(secoes, 'classificacoes')
+        snap.indice_titulos = IndiceTitulos.from_parts(
+            TabelaStrings(secoes['titulos'], decodificar=True),
+            secoes['views'].cast('Q'),
+            PostingsMmap.from_sections(secoes, 'trigramas'),
+        )
+        snap.ordens = {c: secoes[f'ordem.{c}'].cast('I') for c in CRITERIOS_ORDEM}
+        snap.ordens_generos = {c: PostingsMmap.from_sections(secoes, f'generos.{c}') for c in CRITERIOS_ORDEM}
+        snap.posicoes = PosicoesMmap(secoes['ids.ordenados'].cast('Q'), secoes['ids.posicoes'].cast('I'))
+        snap.mapa = mapa
+        return snap
+
+    def registro_por_id(self, filme_id: int):
+        """Registro do filme pelo filme_id estável; None se ele não está no catálogo."""
+        posicao = self.posicoes.get(filme_id)
+        return None if posicao is None else self.registros[posicao]
+
+# --- SNAPSHOT BINÁRIO (CARGA RÁPIDA COM MMAP) ---
+#
+# Layout (little-endian, seções alinhadas em 8 bytes):
+#   cabeçalho: MAGIC (8) | versão (40, ascii) | n_filmes (u32) | n_secoes (u32)
+#   tabela de seções: n_secoes x [nome (24) | offset (u64) | tamanho (u64)]
+#   seções: 'categorias' (JSON), 'filmes' e 'titulos' (tabelas de strings),
+#   'ids' (u64, filme_id estável de cada posição), 'ids.ordenados' (u64) e
+#   'ids.posicoes' (u32) para a busca binária filme_id -> posição,
+#   'views' (u64 por filme), 'ordem.<criterio>' (u32, posições já ordenadas)
+#   e, para cada índice ('generos', 'anos', 'tipos', 'classificacoes',
+#   'trigramas', 'generos.<criterio>'),
+#   '<nome>.chaves' (tabela de strings ordenada), '<nome>.inicios' (u64) e
+#   '<nome>.ids' (u32 com as posições dos filmes).
+
+BINARY_MAGIC = b'FILMCAT\x04'
+_CABECALHO = struct.Struct('<8s40sII')
+_SECAO = struct.Struct('<24sQQ')
+
+class TabelaStrings:
+    """
+    Tabela de strings do snapshot: n (u32) + pad, (n+1) offsets u64 e o blob
+    de bytes. O item i é lido do mapa só quando acessado.
+    """
+    __slots__ = ('offsets', 'blob', 'decodificar')
+
+    def __init__(self, mem: memoryview, decodificar: bool = False):
+        n, = struct.unpack_from('<I', mem, 0)
+        fim_offsets = 8 + 8 * (n + 1)
+        self.offsets = mem[8:fim_offsets].cast('Q')
+        self.blob = mem[fim_offsets:]
+        self.decodificar = decodificar
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int):
+        if not 0 <= i < len(self.offsets) - 1:
+            raise IndexError(i)
+        valor = bytes(self.blob[self.offsets[i]:self.offsets[i + 1]])
+        return valor.decode('utf-8') if self.decodificar else valor
+
+    @staticmethod
+    def pack(valores: list) -> bytes:
+        offsets = [0]
+        for valor in valores:
+            offsets.append(offsets[-1] + len(valor))
+        return struct.pack(f'<I4x{len(offsets)}Q', len(valores), *offsets) + b''.join(valores)
+
+class PostingsMmap:
+    """Índice invertido lido do snapshot: chaves ordenadas (busca binária) -> ids u32."""
+    __slots__ = ('chaves', 'inicios', 'ids')
+
+    def __init__(self, chaves: TabelaStrings, inicios: memoryview, ids: memoryview):
+        self.chaves = chaves
+        self.inicios = inicios
+        self.ids = ids
+
+    @classmethod
+    def from_sections(cls, secoes: dict, nome: str) -> 'PostingsMmap':
+        return cls(
+            TabelaStrings(secoes[f'{nome}.chaves']),
+            secoes[f'{nome}.inicios'].cast('Q'),
+            secoes[f'{nome}.ids'].cast('I'),
+        )
+
+    def get(self, chave: str, padrao=None):
+        chave_bytes = chave.encode('utf-8')
+        i = bisect.bisect_left(self.chaves, chave_bytes)
+        if i < len(self.chaves) and self.chaves[i] == chave_bytes:
+            return self.ids[self.inicios[i]:self.inicios[i + 1]]
+        return padrao
+
+    def keys(self):
+        return [chave.decode('utf-8') for chave in (self.chaves[i] for i in range(len(self.chaves)))]
+
+    def items(self):
+        return [(chave, self.get(chave)) for chave in self.keys()]
+
+    def __contains__(self, chave: str) -> bool:
+        return self.get(chave) is not None
+
+    @staticmethod
+    def pack(nome: str, indice: dict) -> dict:
+        chaves = sorted(indice, key=lambda c: c.encode('utf-8'))
+        inicios = [0]
+        ids = []
+        for chave in chaves:
+            ids.extend(indice[chave])
+            inicios.append(len(ids))
+        return {
+            f'{nome}.chaves': TabelaStrings.pack([c.encode('utf-8') for c in chaves]),
+            f'{nome}.inicios': struct.pack(f'<{len(inicios)}Q', *inicios),
+            f'{nome}.ids': struct.pack(f'<{len(ids)}I', *ids),
+        }
+
+class PosicoesMmap:
+    """Mapa filme_id -> posição lido do snapshot: busca binária nos ids ordenados."""
+    __slots__ = ('ids', 'posicoes')
+
+    def __init__(self, ids: memoryview, posicoes: memoryview):
+        self.ids = ids
+        self.posicoes = posicoes
+
+    def get(self, filme_id: int, padrao=None):
+        i = bisect.bisect_left(self.ids, filme_id)
+        if i < len(self.ids) and self.ids[i] == filme_id:
+            return self.posicoes[i]
+        return padrao
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def pack(ids: list) -> dict:
+        ordenados = sorted(range(len(ids)), key=ids.__getitem__)
+        return {
+            'ids': struct.pack(f'<{len(ids)}Q', *ids),
+            'ids.ordenados': struct.pack(f'<{len(ids)}Q', *(ids[p] for p in ordenados)),
+            'ids.posicoes': struct.pack(f'<{len(ids)}I', *ordenados),
+        }
+
+class RegistrosMmap:
+    """Sequência de FilmeRegistro decodificados do snapshot binário na primeira leitura."""
+    __slots__ = ('tabela', 'ids', 'cache')
+
+    def __init__(self, tabela: TabelaStrings, ids: memoryview):
+        self.tabela = tabela
+        self.ids = ids
+        self.cache = [None] * len(tabela)
+
+    def __len__(self):
+        return len(self.cache)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self.cache)))]
+        registro = self.cache[i]
+        if registro is None:
+            i = range(len(self.cache))[i]
+            registro = FilmeRegistro(self.ids[i], json.loads(self.tabela[i]))
+            self.cache[i] = registro
+        return registro
+
+    def __iter__(self):
+        for i in range(len(self.cache)):
+            yield self[i]
+
+def read_binary_sections(mapa) -> tuple:
+    """Valida o cabeçalho e devolve ({nome: memoryview}, versão)."""
+    mem = memoryview(mapa)
+    magic, versao, _, n_secoes = _CABECALHO.unpack_from(mapa, 0)
+    if magic != BINARY_MAGIC:
+        raise ValueError("arquivo não é um snapshot de catálogo")
+
+    secoes = {}
+    for i in range(n_secoes):
+        nome, offset, tamanho = _SECAO.unpack_from(mapa, _CABECALHO.size + i * _SECAO.size)
+        secoes[nome.rstrip(b'\0').decode('ascii')] = mem[offset:offset + tamanho]
+    return secoes, versao.rstrip(b'\0').decode('ascii')
+
+def write_binary_snapshot(snap: CatalogoSnapshot, caminho: str = BINARY_FILE):
+    """Grava o snapshot binário do catálogo (troca atômica do arquivo)."""
+    registros = list(snap.registros)
+    secoes = {
+        'categorias': json.dumps(snap.categorias, ensure_ascii=False).encode('utf-8'),
+        'filmes': TabelaStrings.pack([
+            json.dumps(r.original, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+            for r in registros
+        ]),
+        'titulos': TabelaStrings.pack([r.titulo_norm.encode('utf-8') for r in registros]),
+        'views': struct.pack(f'<{len(registros)}Q', *(r.views for r in registros)),
+    }
+    secoes.update(PosicoesMmap.pack([r.filme_id for r in registros]))
+    secoes.update(PostingsMmap.pack('generos', snap.indice_generos))
+    secoes.update(PostingsMmap.pack('anos', snap.indice_anos))
+    secoes.update(PostingsMmap.pack('tipos', snap.indice_tipos))
+    secoes.update(PostingsMmap.pack('classificacoes', snap.indice_classificacoes))
+    secoes.update(PostingsMmap.pack('trigramas', snap.indice_titulos.postings))
+    for criterio in CRITERIOS_ORDEM:
+        ordem = snap.ordens[criterio]
+        secoes[f'ordem.{criterio}'] = struct.pack(f'<{len(ordem)}I', *ordem)
+        secoes.update(PostingsMmap.pack(f'generos.{criterio}', snap.ordens_generos[criterio]))
+
+    inicio_dados = _CABECALHO.size + len(secoes) * _SECAO.size
+    tabela = bytearray()
+    corpo = bytearray()
+    for nome, dados in secoes.items():
+        corpo += b'\0' * (-(inicio_dados + len(corpo)) % 8)
+        tabela += _SECAO.pack(nome.encode('ascii'), inicio_dados + len(corpo), len(dados))
+        corpo += dados
+
+    cabecalho = _CABECALHO.pack(BINARY_MAGIC, snap.versao.encode('ascii'), len(registros), len(secoes))
+    temporario = f"{caminho}.tmp"
+    with open(temporario, 'wb') as f:
+        f.write(cabecalho)
+        f.write(tabela)
+        f.write(corpo)
+    os.replace(temporario, caminho)
+
+def load_snapshot() -> CatalogoSnapshot:
+    """
+    Carrega o catálogo do snapshot binário (mmap) quando ele existe e não é
+    mais antigo que o DATA_FILE; caso contrário (ou se ele estiver corrompido),
+    faz o parse do JSON.
+    """
+    if CATALOGO_FORMATO != 'json' and sys.byteorder == 'little':
+        assinatura_bin = file_signature(BINARY_FILE)
+        assinatura_json = file_signature(DATA_FILE)
+        em_dia = not assinatura_json or (assinatura_bin and assinatura_bin[0] >= assinatura_json[0])
+        if assinatura_bin and (CATALOGO_FORMATO == 'bin' or em_dia):
+            try:
+                return CatalogoSnapshot.from_binary(BINARY_FILE)
+            except Exception as e:
+                print(f"AVISO: Snapshot binário '{BINARY_FILE}' inválido ({e}); usando {DATA_FILE}.")
+    return CatalogoSnapshot(*load_data())
+
+# Carregamento global na inicialização
+SNAPSHOT = load_snapshot()
+VALID_TOKENS = load_tokens()
+
+def warm_snapshot(snap: CatalogoSnapshot = None) -> int:
+    """
+    Pré-codifica os fragmentos JSON dos registros de um snapshot carregado do
+    JSON (onde os registros já são objetos Python). Usada no processo master
+    antes do fork (gunicorn.conf.py): assim os workers herdam os fragmentos em
+    vez de cada um criar sua cópia. No snapshot binário não faz nada:
+    materializar os registros do mmap no master criaria objetos cujo refcount
+    os workers escrevem a cada acesso, copiando as páginas que o mmap deixaria
+    compartilhadas; lá cada worker decodifica só os registros que usa.
+    Devolve quantos registros foram pré-codificados.
+    """
+    snap = snap or SNAPSHOT
+    if isinstance(snap.registros, RegistrosMmap):
+        return 0
+    for registro in snap.registros:
+        registro.fragmento_json()
+    return len(snap.registros)
+
+def current_snapshot() -> CatalogoSnapshot:
+    """Snapshot fixado para a requisição atual (o mesmo do início ao fim dela)."""
+    if has_request_context():
+        if 'snapshot' not in g:
+            g.snapshot = SNAPSHOT
+        return g.snapshot
+    return SNAPSHOT
+
+# --- RECARGA A QUENTE DOS ARQUIVOS DE DADOS ---
+
+# Intervalo mínimo entre verificações de mudança nos arquivos (segundos)
+RELOAD_INTERVALO = float(os.environ.get('RELOAD_INTERVALO', 30))
+# Token do endpoint administrativo de recarga (desligado se vazio)
+ADMIN_TOKEN = os.environ.get('API_ADMIN_TOKEN', '')
+
+class Recarregador:
+    """
+    Observa DATA_FILE/TOKENS_FILE por mtime/tamanho e, quando mudam, reconstrói
+    o snapshot numa thread separada (fora do caminho da requisição) e faz a
+    troca atômica das referências globais.
+    """
+
+    def __init__(self, intervalo: float = RELOAD_INTERVALO):
+        self.intervalo = intervalo
+        self.assinaturas = {DATA_FILE: file_signature(DATA_FILE), TOKENS_FILE: file_signature(TOKENS_FILE)}
+        self.ultima_verificacao = time.monotonic()
+        self.lock = threading.Lock()
+        self.lock_recarga = threading.Lock()
+        self.thread = None
+
+    def verificar(self):
+        """Barato o bastante para rodar a cada requisição: no máximo um stat por intervalo."""
+        agora = time.monotonic()
+        if agora - self.ultima_verificacao < self.intervalo or not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.ultima_verificacao = agora
+            mudancas = [
+                caminho for caminho, assinatura in self.assinaturas.items()
+                if file_signature(caminho) != assinatura
+            ]
+            if mudancas and not (self.thread and self.thread.is_alive()):
+                self.thread = threading.Thread(
+                    target=self.recarregar,
+                    kwargs={'dados': DATA_FILE in mudancas, 'tokens': TOKENS_FILE in mudancas},
+                    daemon=True,
+                )
+                self.thread.start()
+        finally:
+            self.lock.release()
+
+    def recarregar(self, dados: bool = True, tokens: bool = True):
+        """Reconstrói o que mudou e troca as referências globais."""
+        global SNAPSHOT, VALID_TOKENS
+
+        with self.lock_recarga:
+            if tokens:
+                self.assinaturas[TOKENS_FILE] = file_signature(TOKENS_FILE)
+                VALID_TOKENS = load_tokens()
+                LIMITADOR.configurar(load_token_limits())
+
+            if dados:
+                self.assinaturas[DATA_FILE] = file_signature(DATA_FILE)
+                filmes, categorias, versao = load_data()
+                if versao == 'vazio':
+                    print(f"AVISO: Recarga de {DATA_FILE} falhou; mantendo a versão {SNAPSHOT.versao[:8]}.")
+                elif versao != SNAPSHOT.versao:
+                    SNAPSHOT = CatalogoSnapshot(filmes, categorias, versao, anterior=SNAPSHOT)
+                    METRICAS.inc(M_RECARGAS)
+                    print(f"Catálogo recarregado: {len(filmes)} filmes (versão {versao[:8]}).")
+
+    def iniciar_polling(self):
+        """Thread de polling contínuo, para servidores de longa duração (fora do serverless)."""
+        def loop():
+            while True:
+                time.sleep(self.intervalo)
+                self.verificar()
+        threading.Thread(target=loop, daemon=True).start()
+
+RECARREGADOR = Recarregador()
+
+@app.before_request
+def check_data_files():
+    RECARREGADOR.verificar()
+
+def require_admin_token(f):
+    """Rotas administrativas: exigem 'Bearer <ADMIN_TOKEN>' (e ficam fechadas se ele não está configurado)."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        auth_header = request.headers.get('Authorization', '')
+        if not ADMIN_TOKEN or not hmac.compare_digest(auth_header, f"Bearer {ADMIN_TOKEN}"):
+            return jsonify({"erro": "Acesso negado."}), 403
+        return f(*args, **kwargs)
+
+    return decorated
+
+@app.route('/admin/reload', methods=['POST'])
+@require_admin_token
+def admin_reload():
+    """Dispara a recarga dos arquivos de dados (exige o ADMIN_TOKEN)."""
+    threading.Thread(target=RECARREGADOR.recarregar, daemon=True).start()
+    return jsonify({"status": "recarregando", "versao_atual": SNAPSHOT.versao}), 202
+
+# --- CONTROLE DE ADMISSÃO POR TOKEN ---
+#
+# Exemplo de api_tokens.json com limites ("padrao" vale para todos os tokens sem bloco próprio):
+#   {"valid_tokens": ["app", "parceiro"],
+#    "limites": {"padrao": {"requisicoes_por_segundo": 10, "rajada": 30, "streams_simultaneos": 4},
+#                "parceiro": {"requisicoes_por_segundo": 50, "streams_simultaneos": 20}}}
+
+# Limites padrão de cada token de API (0 = sem limite); "limites" no api_tokens.json muda o padrão e cada token
+LIMITE_REQUISICOES_POR_SEGUNDO = float(os.environ.get('LIMITE_REQUISICOES_POR_SEGUNDO', 0))
+# Rajada do balde de fichas (0 = o dobro da taxa)
+LIMITE_RAJADA = float(os.environ.get('LIMITE_RAJADA', 0))
+# Streams simultâneos no /player_proxy por token
+LIMITE_STREAMS = int(os.environ.get('LIMITE_STREAMS', 0))
+# Retry-After sugerido quando o token está no limite de streams (segundos)
+LIMITE_STREAMS_RETRY_AFTER = 5
+# Backend compartilhado dos limites (ex: redis://localhost:6379/0); vazio = memória do processo
+LIMITES_BACKEND = os.environ.get('LIMITES_BACKEND', '')
+
+def api_token_id(token: str) -> str:
+    """
+    Identificador curto do token de API, usado nos limites e dentro dos
+    temp_tokens (cujo payload qualquer um decodifica). É um HMAC com a
+    SECRET_KEY_ASSINATURA: sem a chave, não dá para testar palpites de token
+    contra ele.
+    """
+    digest = hmac.new(SECRET_KEY_ASSINATURA.encode('utf-8'), token.encode('utf-8'), 'blake2b').digest()
+    return base64.urlsafe_b64encode(digest[:6]).decode('ascii')
+
+class LimiteToken:
+    """Limites de um token: taxa do balde (req/s), rajada e streams simultâneos (0 = sem limite)."""
+    __slots__ = ('taxa', 'rajada', 'streams')
+
+    def __init__(self, taxa: float = 0, rajada: float = 0, streams: int = 0):
+        self.taxa = taxa
+        self.rajada = rajada or max(1.0, 2 * taxa)
+        self.streams = streams
+
+    @classmethod
+    def from_config(cls, config: dict, base: 'LimiteToken') -> 'LimiteToken':
+        """Campos de api_tokens.json ("requisicoes_por_segundo", "rajada", "streams_simultaneos") sobre 'base'."""
+        taxa = float(config.get('requisicoes_por_segundo', base.taxa))
+        # Sem "rajada" explícita, ela acompanha a taxa do próprio token
+        rajada = float(config.get('rajada', base.rajada if taxa == base.taxa else 0))
+        return cls(taxa, rajada, int(config.get('streams_simultaneos', base.streams)))
+
+class EstadoLimites:
+    """Balde de fichas (None = cheio) e streams abertos de um token, com lock próprio."""
+    __slots__ = ('fichas', 'atualizado', 'streams', 'lock')
+
+    def __init__(self):
+        self.fichas = None
+        self.atualizado = time.monotonic()
+        self.streams = 0
+        self.lock = threading.Lock()
+
+class BackendLimitesMemoria:
+    """
+    Limites na memória do processo. Com vários workers cada um tem os seus
+    baldes, então o limite efetivo é multiplicado pelo número de workers; use
+    o backend Redis para um limite global.
+    """
+
+    def __init__(self):
+        self.estados = {}
+
+    def _estado(self, chave: str) -> EstadoLimites:
+        # setdefault é atômico: tokens diferentes nunca disputam um lock
+        estado = self.estados.get(chave)
+        if estado is None:
+            estado = self.estados.setdefault(chave, EstadoLimites())
+        return estado
+
+    def consumir(self, chave: str, taxa: float, rajada: float) -> float:
+        """Tira uma ficha do balde; devolve 0 ou quantos segundos faltam para a próxima ficha."""
+        estado = self._estado(chave)
+        with estado.lock:
+            agora = time.monotonic()
+            if estado.fichas is None:
+                fichas = rajada
+            else:
+                fichas = min(rajada, estado.fichas + (agora - estado.atualizado) * taxa)
+            estado.atualizado = agora
+            if fichas >= 1:
+                estado.fichas = fichas - 1
+                return 0.0
+            estado.fichas = fichas
+            return (1 - fichas) / taxa
+
+    def abrir_stream(self, chave: str, maximo: int) -> bool:
+        estado = self._estado(chave)
+        with estado.lock:
+            if estado.streams >= maximo:
+                return False
+            estado.streams += 1
+            return True
+
+    def fechar_stream(self, chave: str):
+        estado = self.estados.get(chave)
+        if estado is not None:
+            with estado.lock:
+                estado.streams = max(0, estado.streams - 1)
+
+    def stats(self) -> dict:
+        return {"backend": "memoria", "tokens": len(self.estados),
+                "streams_abertos": sum(estado.streams for estado in list(self.estados.values()))}
+
+class BackendLimitesRedis:
+    """
+    Os mesmos limites compartilhados por todos os processos via Redis: o
+    balde e o contador de streams são atualizados atomicamente por scripts
+    Lua. Contadores de streams expiram sozinhos (STREAMS_TTL) se um
+    processo morrer com streams abertos.
+    """
+    STREAMS_TTL = 6 * 3600
+
+    _SCRIPT_BALDE = """
+    local taxa, rajada, agora = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local estado = redis.call('HMGET', KEYS[1], 'f', 't')
+    local fichas = tonumber(estado[1]) or rajada
+    local atualizado = tonumber(estado[2]) or agora
+    fichas = math.min(rajada, fichas + math.max(0, agora - atualizado) * taxa)
+    local espera = 0
+    if fichas >= 1 then fichas = fichas - 1 else espera = (1 - fichas) / taxa end
+    redis.call('HSET', KEYS[1], 'f', fichas, 't', agora)
+    redis.call('EXPIRE', KEYS[1], math.ceil(rajada / taxa) + 1)
+    return tostring(espera)
+    """
+    _SCRIPT_STREAM = """
+    local abertos = redis.call('INCR', KEYS[1])
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    if abertos > tonumber(ARGV[1]) then
+        redis.call('DECR', KEYS[1])
+        return 0
+    end
+    return 1
+    """
+
+    def __init__(self, cliente, prefixo: str = 'api_filmes:limites:'):
+        self.cliente = cliente
+        self.prefixo = prefixo
+        self.balde = cliente.register_script(self._SCRIPT_BALDE)
+        self.stream = cliente.register_script(self._SCRIPT_STREAM)
+
+    def consumir(self, chave: str, taxa: float, rajada: float) -> float:
+        return float(self.balde(keys=[self.prefixo + 'balde:' + chave], args=[taxa, rajada, time.time()]))
+
+    def abrir_stream(self, chave: str, maximo: int) -> bool:
+        return bool(self.stream(keys=[self.prefixo + 'streams:' + chave], args=[maximo, self.STREAMS_TTL]))
+
+    def fechar_stream(self, chave: str):
+        self.cliente.decr(self.prefixo + 'streams:' + chave)
+
+    def stats(self) -> dict:
+        return {"backend": "redis"}
+
+def create_limits_backend(url: str = LIMITES_BACKEND):
+    if not url:
+        return BackendLimitesMemoria()
+    if redis is None:
+        print(f"AVISO: LIMITES_BACKEND={url} exige o pacote 'redis'; usando limites em memória.")
+        return BackendLimitesMemoria()
+    return BackendLimitesRedis(redis.Redis.from_url(url))
+
+class LimitadorTokens:
+    """
+    Controle de admissão por token de API: balde de fichas para as rotas da
+    API e teto de streams simultâneos no /player_proxy. O backend guarda o
+    estado (memória do processo ou compartilhado); se ele falhar, a
+    requisição é admitida, para o limitador nunca derrubar a API.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or create_limits_backend()
+        self.padrao = LimiteToken(LIMITE_REQUISICOES_POR_SEGUNDO, LIMITE_RAJADA, LIMITE_STREAMS)
+        self.por_token = {}
+
+    def configurar(self, limites: dict):
+        """Aplica o bloco "limites" do api_tokens.json (chaves: "padrao" ou o próprio token)."""
+        base = LimiteToken(LIMITE_REQUISICOES_POR_SEGUNDO, LIMITE_RAJADA, LIMITE_STREAMS)
+        try:
+            padrao = LimiteToken.from_config(limites.get('padrao', {}), base)
+            por_token = {
+                api_token_id(token): LimiteToken.from_config(config, padrao)
+                for token, config in limites.items() if token != 'padrao' and isinstance(config, dict)
+            }
+        except (TypeError, ValueError, AttributeError) as e:
+            print(f"AVISO: Bloco 'limites' de {TOKENS_FILE} inválido ({e}); mantendo os limites atuais.")
+            return
+        self.padrao, self.por_token = padrao, por_token
+
+    def limite(self, id_token: str) -> LimiteToken:
+        return self.por_token.get(id_token, self.padrao)
+
+    def admitir(self, id_token: str) -> float:
+        """0 se a requisição pode seguir; senão, os segundos até o token ter uma ficha de novo."""
+        limite = self.limite(id_token)
+        if not limite.taxa:
+            return 0.0
+        try:
+            espera = self.backend.consumir(id_token, limite.taxa, limite.rajada)
+        except Exception as e:
+            print(f"AVISO: Backend de limites indisponível ({e}); admitindo a requisição.")
+            return 0.0
+        if espera:
+            METRICAS.inc(M_RECUSAS, (('motivo', 'taxa'),))
+        return espera
+
+    def abrir_stream(self, id_token: str):
+        """
+        Função que fecha o stream (chamar ao fim da resposta; repetir não faz
+        mal) ou None se o token já está no teto de streams simultâneos.
+        """
+        limite = self.limite(id_token)
+        if id_token is None or not limite.streams:
+            return lambda: None
+        try:
+            if not self.backend.abrir_stream(id_token, limite.streams):
+                METRICAS.inc(M_RECUSAS, (('motivo', 'streams'),))
+                return None
+        except Exception as e:
+            print(f"AVISO: Backend de limites indisponível ({e}); admitindo o stream.")
+            return lambda: None
+
+        fechado = threading.Event()
+        def fechar():
+            if not fechado.is_set():
+                fechado.set()
+                try:
+                    self.backend.fechar_stream(id_token)
+                except Exception as e:
+                    print(f"AVISO: Backend de limites indisponível ao fechar stream ({e}).")
+        return fechar
+
+    def stats(self) -> dict:
+        return dict(self.backend.stats(), tokens_configurados=len(self.por_token))
+
+LIMITADOR = LimitadorTokens()
+LIMITADOR.configurar(load_token_limits())
+
+def too_many_requests(espera: float, mensagem: str):
+    """Resposta 429 com o Retry-After (segundos inteiros, arredondados para cima)."""
+    resp = jsonify({"erro": mensagem})
+    resp.status_code = 429
+    resp.headers['Retry-After'] = str(max(1, math.ceil(espera)))
+    return resp
+
+def require_api_token(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        auth_header = request.headers.get('Authorization')
+        token = auth_header.split(' ')[1] if auth_header and auth_header.startswith('Bearer ') else None
+        if not token:
+            token = request.args.get('token')
+            
+        if token and token in VALID_TOKENS:
+            g.id_token = api_token_id(token)
+            espera = LIMITADOR.admitir(g.id_token)
+            if espera:
+                return too_many_requests(espera, "Limite de requisições do token de API excedido. Tente novamente mais tarde.")
+            return f(*args, **kwargs)
+        else:
+            return jsonify({"erro": "Acesso negado. Token de API inválido ou ausente."}), 401
+            
+    return decorated
+
+# --- MÉTRICAS (FORMATO PROMETHEUS) ---
+
+# Limites dos histogramas: latência (segundos) e tamanho (bytes)
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_TAMANHO = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+# Faixas de contadores: cada thread escreve sempre na mesma, com lock próprio
+METRICAS_FAIXAS = 16
+
+class Metricas:
+    """
+    Contadores e histogramas exportados em /metrics. Cada escrita vai para uma
+    das faixas (escolhida pelo id nativo da thread), cada uma com seu lock:
+    não há lock global no caminho da requisição e threads diferentes quase
+    nunca disputam o mesmo. A coleta soma as faixas.
+    """
+
+    def __init__(self, faixas: int = METRICAS_FAIXAS):
+        self.definicoes = {}
+        self.faixas = [({}, threading.Lock()) for _ in range(faixas)]
+
+    def definir(self, nome: str, tipo: str, ajuda: str, buckets: tuple = None) -> str:
+        self.definicoes[nome] = (tipo, ajuda, buckets)
+        return nome
+
+    def _faixa(self):
+        return self.faixas[threading.get_native_id() % len(self.faixas)]
+
+    def inc(self, nome: str, rotulos: tuple = (), valor=1):
+        valores, lock = self._faixa()
+        chave = (nome, rotulos)
+        with lock:
+            valores[chave] = valores.get(chave, 0) + valor
+
+    def observe(self, nome: str, valor: float, rotulos: tuple = ()):
+        buckets = self.definicoes[nome][2]
+        i = bisect.bisect_left(buckets, valor)
+        valores, lock = self._faixa()
+        chave = (nome, rotulos)
+        with lock:
+            histograma = valores.get(chave)
+            if histograma is None:
+                # Contagem por bucket (o último é o +Inf) e, no fim, a soma dos valores
+                histograma = valores[chave] = [0] * (len(buckets) + 1) + [0.0]
+            histograma[i] += 1
+            histograma[-1] += valor
+
+    def coletar(self) -> dict:
+        """Soma das faixas: {(nome, rotulos): valor ou [contagens..., soma]}."""
+        total = {}
+        for valores, lock in self.faixas:
+            with lock:
+                itens = [(chave, list(v) if isinstance(v, list) else v) for chave, v in valores.items()]
+            for chave, valor in itens:
+                if isinstance(valor, list):
+                    atual = total.setdefault(chave, [0] * len(valor))
+                    for j, parcela in enumerate(valor):
+                        atual[j] += parcela
+                else:
+                    total[chave] = total.get(chave, 0) + valor
+        return total
+
+    @staticmethod
+    def _rotulos(rotulos: tuple, extra: tuple = ()) -> str:
+        pares = rotulos + extra
+        if not pares:
+            return ''
+        escapados = (
+            (nome, str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for nome, valor in pares
+        )
+        return '{' + ','.join(f'{nome}="{valor}"' for nome, valor in escapados) + '}'
+
+    def render(self, instantaneos: list = ()) -> str:
+        """
+        Texto no formato de exposição do Prometheus. 'instantaneos' traz
+        (nome, rotulos, valor) calculados na hora da coleta (gauges e
+        contadores mantidos por outros componentes, como os caches).
+        """
+        series = {}
+        for (nome, rotulos), valor in self.coletar().items():
+            series.setdefault(nome, []).append((rotulos, valor))
+        for nome, rotulos, valor in instantaneos:
+            series.setdefault(nome, []).append((rotulos, valor))
+
+        linhas = []
+        for nome, (tipo, ajuda, buckets) in self.definicoes.items():
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            for rotulos, valor in sorted(series.get(nome, []), key=lambda item: item[0]):
+                if tipo != 'histogram':
+                    linhas.append(f"{nome}{self._rotulos(rotulos)} {valor}")
+                    continue
+                acumulado = 0
+                for limite, contagem in zip(buckets + ('+Inf',), valor):
+                    acumulado += contagem
+                    linhas.append(f"{nome}_bucket{self._rotulos(rotulos, (('le', limite),))} {acumulado}")
+                linhas.append(f"{nome}_sum{self._rotulos(rotulos)} {valor[-1]}")
+                linhas.append(f"{nome}_count{self._rotulos(rotulos)} {acumulado}")
+        return '\n'.join(linhas) + '\n'
+
+METRICAS = Metricas()
+
+M_REQUISICOES = METRICAS.definir(
+    'api_filmes_http_requests_total', 'counter', 'Requisições atendidas, por rota, método e status.')
+M_LATENCIA = METRICAS.definir(
+    'api_filmes_http_request_duration_seconds', 'histogram',
+    'Tempo até a resposta ficar pronta (no streaming, até o início do corpo), por rota.', BUCKETS_LATENCIA)
+M_TAMANHO = METRICAS.definir(
+    'api_filmes_http_response_size_bytes', 'histogram',
+    'Tamanho do corpo das respostas de tamanho conhecido, por rota.', BUCKETS_TAMANHO)
+M_CATALOGO_FILMES = METRICAS.definir('api_filmes_catalogo_filmes', 'gauge', 'Filmes no catálogo atual.')
+M_CATALOGO_INFO = METRICAS.definir('api_filmes_catalogo_info', 'gauge', 'Versão (sha1) do catálogo atual.')
+M_RECARGAS = METRICAS.definir('api_filmes_catalogo_recargas_total', 'counter', 'Recargas do catálogo aplicadas.')
+M_CACHE = METRICAS.definir(
+    'api_filmes_cache_requests_total', 'counter', 'Consultas aos caches internos, por cache e resultado.')
+M_CACHE_MIDIA_BYTES = METRICAS.definir(
+    'api_filmes_cache_midia_bytes_total', 'counter', 'Bytes de mídia servidos, por origem (cache ou upstream).')
+M_UPSTREAM_REQUISICOES = METRICAS.definir(
+    'api_filmes_upstream_requests_total', 'counter', 'Requisições do proxy às origens de mídia, por status.')
+M_UPSTREAM_CONEXAO = METRICAS.definir(
+    'api_filmes_upstream_connect_seconds', 'histogram', 'Tempo para abrir conexão (TCP + TLS) com a origem.',
+    BUCKETS_LATENCIA)
+M_UPSTREAM_TTFB = METRICAS.definir(
+    'api_filmes_upstream_ttfb_seconds', 'histogram', 'Tempo até os cabeçalhos de resposta da origem.',
+    BUCKETS_LATENCIA)
+M_UPSTREAM_BYTES = METRICAS.definir(
+    'api_filmes_upstream_bytes_total', 'counter', 'Bytes de corpo recebidos das origens e repassados.')
+M_RECUSAS = METRICAS.definir(
+    'api_filmes_admissao_recusas_total', 'counter', 'Requisições recusadas com 429, por motivo (taxa ou streams).')
+M_LINKS = METRICAS.definir(
+    'api_filmes_links_midia', 'gauge', 'Links de mídia por estado na última sondagem (vivos, mortos, desconhecidos).')
+
+def count_upstream_bytes(blocos):
+    """Repassa os blocos do corpo da origem contando os bytes (registrados ao fim do stream)."""
+    total = 0
+    try:
+        for bloco in blocos:
+            total += len(bloco)
+            yield bloco
+    finally:
+        METRICAS.inc(M_UPSTREAM_BYTES, valor=total)
+
+@app.before_request
+def start_request_timer():
+    g.inicio_requisicao = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(resposta):
+    inicio = g.pop('inicio_requisicao', None)
+    if inicio is not None:
+        rota = request.url_rule.rule if request.url_rule else '<sem_rota>'
+        METRICAS.inc(M_REQUISICOES, (('rota', rota), ('metodo', request.method), ('status', str(resposta.status_code))))
+        METRICAS.observe(M_LATENCIA, time.perf_counter() - inicio, (('rota', rota),))
+        # Em streams (o proxy), calculate_content_length() consumiria o corpo inteiro na memória
+        tamanho = resposta.calculate_content_length() if resposta.is_sequence else resposta.content_length
+        if tamanho is not None:
+            METRICAS.observe(M_TAMANHO, tamanho, (('rota', rota),))
+    return resposta
+
+# --- CACHE DE RESPOSTAS (JSON PRÉ-SERIALIZADO E PRÉ-COMPRIMIDO) ---
+
+# Número máximo de respostas distintas guardadas (LRU)
+CACHE_RESPOSTAS_MAX = int(os.environ.get('CACHE_RESPOSTAS_MAX', 512))
+# Orçamento total em bytes (corpo + variantes comprimidas); respostas maiores que ele não são guardadas
+CACHE_RESPOSTAS_BYTES = int(os.environ.get('CACHE_RESPOSTAS_BYTES', 256 * 1024 * 1024))
+# Quanto uma requisição espera a mesma resposta que outra já está gerando (segundos)
+CACHE_RESPOSTAS_ESPERA = float(os.environ.get('CACHE_RESPOSTAS_ESPERA', 30))
+# Respostas menores que isso não compensam compressão
+TAMANHO_MIN_COMPRESSAO = 1024
+# Acima disso o brotli usa qualidade 9: a 11 (padrão) leva dezenas de segundos em listas de vários MB
+TAMANHO_MAX_BROTLI_11 = 256 * 1024
+
+def compress_body(corpo: bytes, codificacao: str) -> bytes:
+    if codificacao == 'gzip':
+        return gzip.compress(corpo, compresslevel=9, mtime=0)
+    qualidade = 11 if len(corpo) <= TAMANHO_MAX_BROTLI_11 else 9
+    return brotli.compress(corpo, quality=qualidade)
+
+class RespostaCacheada:
+    """
+    Corpo JSON já codificado, suas variantes gzip/brotli e a ETag forte. Cada
+    variante é comprimida só na primeira requisição que a aceita (uma vez só,
+    mesmo com requisições simultâneas) e entregue a 'ao_comprimir', que a
+    guarda contando os bytes no orçamento do cache.
+    """
+    __slots__ = ('chave', 'etag', 'variantes', 'cabecalhos', 'lock', 'ao_comprimir')
+
+    def __init__(self, corpo: bytes, etag: str, cabecalhos: list = None, ao_comprimir=None, chave=None):
+        self.chave = chave
+        self.etag = etag
+        self.cabecalhos = cabecalhos or []
+        self.variantes = {'identity': corpo}
+        self.lock = threading.Lock()
+        self.ao_comprimir = ao_comprimir
+
+    @property
+    def tamanho(self) -> int:
+        return sum(len(v) for v in self.variantes.values())
+
+    def escolher_codificacao(self, accept_encodings) -> str:
+        """Escolhe a melhor variante aceita pelo cliente (br > gzip > identity)."""
+        if len(self.variantes['identity']) < TAMANHO_MIN_COMPRESSAO:
+            return 'identity'
+        for codificacao in ('br', 'gzip'):
+            if (codificacao != 'br' or brotli is not None) and accept_encodings[codificacao]:
+                return codificacao
+        return 'identity'
+
+    def variante(self, codificacao: str) -> bytes:
+        corpo = self.variantes.get(codificacao)
+        if corpo is not None:
+            return corpo
+        with self.lock:
+            corpo = self.variantes.get(codificacao)
+            if corpo is None:
+                corpo = compress_body(self.variantes['identity'], codificacao)
+                if self.ao_comprimir is not None:
+                    self.ao_comprimir(self, codificacao, corpo)
+                else:
+                    self.variantes[codificacao] = corpo
+        return corpo
+
+    def responder(self, req) -> Response:
+        codificacao = self.escolher_codificacao(req.accept_encodings)
+        etag = self.etag if codificacao == 'identity' else f"{self.etag}-{codificacao}"
+
+        if req.if_none_match.contains(etag):
+            resp = Response(status=304)
+        else:
+            resp = Response(self.variante(codificacao), mimetype='application/json')
+            if codificacao != 'identity':
+                resp.headers['Content-Encoding'] = codificacao
+
+        resp.headers.extend(self.cabecalhos)
+        resp.set_etag(etag)
+        resp.vary.add('Accept-Encoding')
+        return resp
+
+class CacheRespostas:
+    """
+    Cache LRU de respostas por (rota, parâmetros normalizados), limitado em
+    entradas e em bytes. As entradas pertencem a uma versão do catálogo:
+    quando a versão muda, o cache é limpo. Misses simultâneos da mesma chave
+    viram uma única geração (single-flight): os demais esperam a primeira.
+    """
+
+    def __init__(self, max_entradas: int = CACHE_RESPOSTAS_MAX, max_bytes: int = CACHE_RESPOSTAS_BYTES):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.versao = None
+        self.entradas = OrderedDict()
+        self.bytes = 0
+        self.em_andamento = {}
+        self.lock = threading.Lock()
+        self.metricas = {'hits': 0, 'misses': 0, 'coalescidos': 0, 'despejos': 0}
+
+    def get(self, chave, versao: str):
+        with self.lock:
+            entrada = self.entradas.get(chave) if versao == self.versao else None
+            if entrada is None:
+                return None
+            self.metricas['hits'] += 1
+            self.entradas.move_to_end(chave)
+            return entrada
+
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self.metricas, entradas=len(self.entradas), bytes=self.bytes, orcamento_bytes=self.max_bytes)
+
+    def iniciar_geracao(self, chave, versao: str) -> tuple:
+        """
+        Single-flight: (True, evento) para quem deve gerar a resposta; (False,
+        evento) para quem deve esperar a geração já em andamento.
+        """
+        with self.lock:
+            evento = self.em_andamento.get((versao, chave))
+            if evento is not None:
+                self.metricas['coalescidos'] += 1
+                return False, evento
+            evento = self.em_andamento[(versao, chave)] = threading.Event()
+            evento.entrada = None
+            self.metricas['misses'] += 1
+            return True, evento
+
+    def terminar_geracao(self, chave, versao: str, entrada: RespostaCacheada = None):
+        """Libera quem espera a chave com a 'entrada' gerada (None se a resposta não é cacheável)."""
+        with self.lock:
+            evento = self.em_andamento.pop((versao, chave), None)
+        if evento is not None:
+            evento.entrada = entrada
+            evento.set()
+
+    def _despejar(self):
+        while self.entradas and (len(self.entradas) > self.max_entradas or self.bytes > self.max_bytes):
+            _, antiga = self.entradas.popitem(last=False)
+            self.bytes -= antiga.tamanho
+            self.metricas['despejos'] += 1
+
+    def _guardar_variante(self, entrada: RespostaCacheada, codificacao: str, corpo: bytes):
+        with self.lock:
+            entrada.variantes[codificacao] = corpo
+            if self.entradas.get(entrada.chave) is entrada:
+                self.bytes += len(corpo)
+                self._despejar()
+
+    def put(self, chave, versao: str, corpo: bytes, cabecalhos: list = None) -> RespostaCacheada:
+        """Guarda e devolve a resposta; se ela sozinha estoura o orçamento, só a devolve."""
+        digest = hashlib.sha1(repr((versao, chave)).encode('utf-8')).hexdigest()
+        entrada = RespostaCacheada(corpo, digest[:32], cabecalhos, self._guardar_variante, chave)
+        if len(corpo) > self.max_bytes:
+            return entrada
+        with self.lock:
+            if versao != self.versao:
+                self.entradas.clear()
+                self.bytes = 0
+                self.versao = versao
+            antiga = self.entradas.pop(chave, None)
+            if antiga is not None:
+                self.bytes -= antiga.tamanho
+            self.entradas[chave] = entrada
+            self.bytes += len(corpo)
+            self._despejar()
+        return entrada
+
+CACHE_RESPOSTAS = CacheRespostas()
+
+# --- PAGINAÇÃO E PROJEÇÃO DE CAMPOS ---
+
+# Campos que podem ser pedidos em '?fields=' (visão pública do filme)
+CAMPOS_FILME = (
+    'ano', 'classificacao', 'duracao', 'filme_id', 'generos', 'imdb', 'sinopse',
+    'titulo', 'url_capa', 'url_poster', 'views', 'url_m3u8_ou_mp4', 'tipo',
+)
+
+class ParametroInvalido(Exception):
+    """Parâmetro de query string inválido (responde 400)."""
+
+@app.errorhandler(ParametroInvalido)
+def handle_parametro_invalido(e):
+    return jsonify({"erro": str(e)}), 400
+
+def encode_cursor(offset: int) -> str:
+    """Cursor opaco para a próxima página."""
+    return base64.urlsafe_b64encode(f"o:{offset}".encode('ascii')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+        prefixo, offset = texto.split(':', 1)
+        if prefixo != 'o' or not offset.isdigit():
+            raise ValueError(texto)
+        return int(offset)
+    except ValueError:
+        raise ParametroInvalido("Parâmetro 'cursor' inválido.")
+
+def _parse_int_param(nome: str, minimo: int) -> int:
+    valor = request.args.get(nome, '')
+    # isdigit() sozinho aceita '²' e outros dígitos Unicode que o int() recusa
+    if not (valor.isascii() and valor.isdigit()) or int(valor) < minimo:
+        raise ParametroInvalido(f"Parâmetro '{nome}' deve ser um inteiro >= {minimo}.")
+    return int(valor)
+
+def parse_list_params() -> tuple:
+    """Lê 'limit', 'offset' (ou 'cursor') e 'fields' da query string: (offset, limite, campos)."""
+    offset = 0
+    if 'cursor' in request.args:
+        offset = decode_cursor(request.args['cursor'])
+    elif 'offset' in request.args:
+        offset = _parse_int_param('offset', 0)
+
+    limite = _parse_int_param('limit', 1) if 'limit' in request.args else None
+
+    campos = None
+    if 'fields' in request.args:
+        campos = tuple(dict.fromkeys(c.strip() for c in request.args['fields'].split(',') if c.strip()))
+        invalidos = [c for c in campos if c not in CAMPOS_FILME]
+        if not campos or invalidos:
+            raise ParametroInvalido(f"Parâmetro 'fields' inválido: {', '.join(invalidos) or 'vazio'}.")
+
+    return offset, limite, campos
+
+def project_fields(registro: FilmeRegistro, campos: tuple) -> dict:
+    """Visão pública reduzida aos campos pedidos."""
+    publico = registro.publico
+    return {campo: publico[campo] for campo in campos if campo in publico}
+
+# --- STREAMING DE LISTAS GRANDES ---
+
+# Tamanho aproximado de cada pedaço enviado no modo streaming
+STREAM_BLOCO = 64 * 1024
+
+def compact_json_output() -> bool:
+    """O jsonify gera saída compacta (fora do modo debug), igual à dos fragmentos pré-codificados."""
+    return not ((app.json.compact is None and app.debug) or app.json.compact is False)
+
+def streaming_requested() -> bool:
+    """
+    O cliente pediu '?stream=1'. Em modo debug o jsonify indenta a saída, então
+    o streaming é desligado para manter os bytes idênticos.
+    """
+    return request.args.get('stream') == '1' and compact_json_output()
+
+def stream_json_array(registros, campos: tuple = None, tamanho_bloco: int = STREAM_BLOCO):
+    """
+    Gera o array JSON dos registros aos poucos, em blocos de ~tamanho_bloco,
+    reaproveitando os fragmentos pré-codificados de cada filme (ou projetando
+    'campos'). A saída é byte a byte igual à do jsonify (separadores compactos
+    e quebra de linha final).
+    """
+    bloco = bytearray(b'[')
+    separador = b''
+    for registro in registros:
+        bloco += separador
+        if campos:
+            bloco += app.json.dumps(project_fields(registro, campos), separators=(',', ':')).encode('utf-8')
+        else:
+            bloco += registro.fragmento_json()
+        separador = b','
+        if len(bloco) >= tamanho_bloco:
+            yield bytes(bloco)
+            bloco.clear()
+    bloco += b']\n'
+    yield bytes(bloco)
+
+def json_list_response(registros, total: int = None):
+    """
+    Resposta com o array JSON das visões públicas, já paginada e projetada
+    conforme a query string, em streaming (chunked) ou via jsonify. O array
+    continua "puro": o total vai em 'X-Total-Count' e o cursor da próxima
+    página em 'X-Next-Cursor'. Com '?vivos=1', os filmes cujo link a sonda
+    viu falhar saem antes da paginação.
+    """
+    offset, limite, campos = parse_list_params()
+    if live_filter_requested():
+        registros = [registro for registro in registros if not SONDA.morto(registro.original.get('url_m3u8_ou_mp4'))]
+        total = len(registros)
+    elif total is None:
+        total = len(registros)
+
+    fim = offset + limite if limite else None
+    if offset or fim is not None:
+        registros = registros[offset:fim]
+
+    if streaming_requested():
+        resp = Response(stream_json_array(registros, campos), mimetype=app.json.mimetype)
+    elif campos:
+        resp = jsonify([project_fields(registro, campos) for registro in registros])
+    elif compact_json_output():
+        # Junta os fragmentos já codificados (no preload, herdados do master) em vez de recodificar cada filme
+        resp = Response(b''.join(stream_json_array(registros)), mimetype=app.json.mimetype)
+    else:
+        resp = jsonify([registro.publico for registro in registros])
+
+    resp.headers['X-Total-Count'] = str(total)
+    proximo = offset + len(registros)
+    if limite and proximo < total:
+        resp.headers['X-Next-Cursor'] = encode_cursor(proximo)
+    return resp
+
+def list_prefix(offset: int, limite: int):
+    """Quantos itens do topo a rota precisa montar: offset+limite, ou todos (None) se '?vivos=1' ainda vai filtrar."""
+    if not limite or live_filter_requested():
+        return None
+    return offset + limite
+
+# Parâmetros de query string que mudam a resposta das rotas de lista (entram na chave do cache)
+PARAMETROS_LISTA = ('limit', 'offset', 'cursor', 'fields', 'vivos')
+
+def cache_response(normalizar=None, parametros: tuple = PARAMETROS_LISTA):
+    """
+    Decorator que serve a resposta a partir do CACHE_RESPOSTAS. A chave é a
+    rota + parâmetros de caminho normalizados (via 'normalizar') + os
+    'parametros' de query string que a rota aceita (só o primeiro valor, que é
+    o que as rotas leem); os demais, inclusive o 'token', ficam de fora, para
+    não criar uma entrada por parâmetro inventado.
+    Apenas respostas 200 são guardadas; o modo streaming não passa pelo cache.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if streaming_requested():
+                return f(*args, **kwargs)
+
+            params = normalizar(**kwargs) if normalizar else tuple(sorted(kwargs.items()))
+            query = tuple((k, request.args[k]) for k in parametros if k in request.args)
+            chave = (request.endpoint, params, query)
+            if live_filter_requested():
+                chave += (SONDA.versao,)
+            versao = current_snapshot().versao
+
+            entrada = CACHE_RESPOSTAS.get(chave, versao)
+            if entrada is not None:
+                return entrada.responder(request)
+
+            lider, evento = CACHE_RESPOSTAS.iniciar_geracao(chave, versao)
+            if not lider:
+                # Espera a geração em andamento; se ela demorar demais ou não for cacheável, gera direto
+                if evento.wait(CACHE_RESPOSTAS_ESPERA) and evento.entrada is not None:
+                    return evento.entrada.responder(request)
+                return f(*args, **kwargs)
+
+            entrada = None
+            try:
+                resposta = app.make_response(f(*args, **kwargs))
+                if resposta.status_code != 200:
+                    return resposta
+                cabecalhos = [(k, v) for k, v in resposta.headers if k.startswith('X-')]
+                entrada = CACHE_RESPOSTAS.put(chave, versao, resposta.get_data(), cabecalhos)
+                return entrada.responder(request)
+            finally:
+                CACHE_RESPOSTAS.terminar_geracao(chave, versao, entrada)
+        return decorated
+    return decorator
+
+# --- ROTAS DE LISTAGEM E BUSCA (ARRAY JSON) ---
+
+@app.route('/', methods=['GET'])
+@require_api_token
+@cache_response()
+def get_all_content():
+    """Lista todos os filmes com ID e dados filtrados (retorna um array direto)."""
+    return json_list_response(current_snapshot().registros)
+
+# Máximo de IDs em "amostra" por categoria ('/categorias?sample=N')
+AMOSTRA_CATEGORIA_MAX = 20
+
+@app.route('/categorias', methods=['GET'])
+@require_api_token
+@cache_response(parametros=('counts', 'sample'))
+def get_all_categories():
+    """
+    Lista todas as categorias, retornando um Array JSON de objetos no formato [{"cat": "nome_categoria"}].
+    Com '?counts=1' cada objeto traz também "total" (filmes no gênero) e com
+    '?sample=N' os IDs dos N filmes mais assistidos em "amostra". Tudo sai dos
+    índices do snapshot e fica no cache de respostas até a próxima versão.
+    """
+    snap = current_snapshot()
+    com_total = request.args.get('counts') == '1'
+    amostra = min(_parse_int_param('sample', 1), AMOSTRA_CATEGORIA_MAX) if 'sample' in request.args else 0
+
+    # MODIFICAÇÃO: Converte a lista simples em uma lista de objetos {"cat": ...}
+    categorias_formatadas = [{"cat": c} for c in snap.categorias]
+    if com_total or amostra:
+        for item in categorias_formatadas:
+            genero = normalizar_texto(item["cat"])
+            if com_total:
+                item["total"] = len(snap.indice_generos.get(genero, []))
+            if amostra:
+                item["amostra"] = [snap.registros[p].filme_id for p in snap.ordens_generos['views'].get(genero, [])[:amostra]]
+    
+    return jsonify(categorias_formatadas)
+    
+@app.route('/<string:categoria_ou_genero>', methods=['GET'])
+@require_api_token
+@cache_response(normalizar=lambda categoria_ou_genero: (normalizar_texto(categoria_ou_genero),))
+def get_content_by_category(categoria_ou_genero):
+    """Filtra por gênero (retorna um array direto)."""
+    termo_normalizado = normalizar_texto(categoria_ou_genero)
+    snap = current_snapshot()
+    ids = snap.indice_generos.get(termo_normalizado, [])
+    resultados = [snap.registros[i] for i in ids]
+
+    if not resultados:
+        return jsonify({
+            "mensagem": f"Nenhum conteúdo encontrado para: {categoria_ou_genero}",
+            "filmes": []
+        }), 404
+        
+    return json_list_response(resultados)
+
+
+@app.route('/titulo/<string:titulo_busca>', methods=['GET'])
+@require_api_token
+@cache_response(normalizar=lambda titulo_busca: (IndiceTitulos.normalizar_consulta(titulo_busca),))
+def get_content_by_title(titulo_busca):
+    """
+    Busca por título (retorna um array direto), ordenada por relevância e
+    popularidade. Com '?limit=N' só os offset+N melhores são ranqueados.
+    """
+    termo_busca_normalizado = IndiceTitulos.normalizar_consulta(titulo_busca)
+    offset, limite, _ = parse_list_params()
+    snap = current_snapshot()
+    ids, total = snap.indice_titulos.buscar_ranqueado(termo_busca_normalizado, list_prefix(offset, limite))
+    resultados = [snap.registros[i] for i in ids]
+
+    if not total:
+        return jsonify({
+            "mensagem": f"Nenhum conteúdo encontrado para o título: {titulo_busca}",
+            "filmes": []
+        }), 404
+        
+    return json_list_response(resultados, total)
+
+
+@app.route('/filme/<int:filme_id>', methods=['GET'])
+@require_api_token
+def get_content_by_id(filme_id):
+    """
+    Filme pelo ID estável (retorna o objeto direto). A ETag vem do conteúdo
+    do filme, então continua valendo entre recargas enquanto ele não muda.
+    """
+    registro = current_snapshot().registro_por_id(filme_id)
+    if registro is None:
+        return jsonify({"erro": f"Filme com ID {filme_id} não encontrado."}), 404
+
+    etag = registro.etag()
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = jsonify(registro.publico)
+    resp.set_etag(etag)
+    return resp
+
+@app.route('/ano/<string:ano_busca>', methods=['GET'])
+@require_api_token
+@cache_response(normalizar=lambda ano_busca: (ano_busca.strip(),))
+def get_content_by_year(ano_busca):
+    """Busca por ano (retorna um array direto)."""
+    ano_normalizado = ano_busca.strip()
+    snap = current_snapshot()
+    ids = snap.indice_anos.get(ano_normalizado, [])
+    resultados = [snap.registros[i] for i in ids]
+
+    if not resultados:
+        return jsonify({
+            "mensagem": f"Nenhum conteúdo encontrado para o ano: {ano_busca}",
+            "filmes": []
+        }), 404
+        
+    return json_list_response(resultados)
+
+@app.route('/top/<string:criterio>', methods=['GET'])
+@app.route('/top/<string:criterio>/<string:genero>', methods=['GET'])
+@require_api_token
+@cache_response(normalizar=lambda criterio, genero=None: (criterio, normalizar_texto(genero) if genero else None))
+def get_top_content(criterio, genero=None):
+    """
+    Catálogo (ou um gênero) ordenado por 'views' ou 'imdb', do maior para o
+    menor (retorna um array direto). '?limit=N' dá o top-N: a rota só fatia
+    a ordem pré-calculada no snapshot.
+    """
+    snap = current_snapshot()
+    if criterio not in CRITERIOS_ORDEM:
+        return jsonify({"erro": f"Critério de ordenação inválido: {criterio}. Use: {', '.join(CRITERIOS_ORDEM)}."}), 404
+
+    if genero is None:
+        ids = snap.ordens[criterio]
+    else:
+        ids = snap.ordens_generos[criterio].get(normalizar_texto(genero), [])
+
+    offset, limite, _ = parse_list_params()
+    total = len(ids)
+    fim = list_prefix(offset, limite)
+    resultados = [snap.registros[i] for i in (ids[:fim] if fim else ids)]
+
+    if not total:
+        return jsonify({
+            "mensagem": f"Nenhum conteúdo encontrado para: {genero or criterio}",
+            "filmes": []
+        }), 404
+
+    return json_list_response(resultados, total)
+
+# Filtros aceitos por /busca: parâmetro -> (índice do snapshot, normalização do valor)
+FACETAS_BUSCA = {
+    'genero': ('indice_generos', normalizar_texto),
+    'ano': ('indice_anos', str.strip),
+    'tipo': ('indice_tipos', normalizar_texto),
+    'classificacao': ('indice_classificacoes', normalizar_texto),
+}
+
+@app.route('/busca', methods=['GET'])
+@require_api_token
+@cache_response(parametros=PARAMETROS_LISTA + tuple(FACETAS_BUSCA) + ('q',))
+def search_content():
+    """
+    Busca combinada (retorna um array direto): '?genero=', '?ano=', '?tipo='
+    e '?classificacao=' são cruzados pelos índices invertidos (da menor lista
+    para a maior); '?q=' filtra por título e ordena por relevância, como em
+    /titulo. Sem 'q', a ordem é a do catálogo.
+    """
+    snap = current_snapshot()
+    listas = []
+    for parametro, (indice, normalizar) in FACETAS_BUSCA.items():
+        if parametro in request.args:
+            listas.append(getattr(snap, indice).get(normalizar(request.args[parametro]), []))
+
+    termo = IndiceTitulos.normalizar_consulta(request.args.get('q', ''))
+    if not listas and not termo:
+        raise ParametroInvalido(
+            f"Informe ao menos um filtro: q, {', '.join(FACETAS_BUSCA)}.")
+
+    ids = intersect_postings(listas) if listas else None
+    if termo:
+        offset, limite, _ = parse_list_params()
+        ids, total = snap.indice_titulos.buscar_ranqueado(termo, list_prefix(offset, limite), ids)
+    else:
+        total = len(ids)
+    resultados = [snap.registros[i] for i in ids]
+
+    if not total:
+        return jsonify({
+            "mensagem": "Nenhum conteúdo encontrado para os filtros informados.",
+            "filmes": []
+        }), 404
+
+    return json_list_response(resultados, total)
+
+# --- TOKENS TEMPORÁRIOS DO PLAYER ---
+
+# Número máximo de temp_tokens já verificados mantidos em memória
+CACHE_TOKENS_MAX = int(os.environ.get('CACHE_TOKENS_MAX', 4096))
+
+def media_url_hash(url: str) -> str:
+    """Resumo curto (64 bits, base64 URL-safe) da URL de mídia, assinado no token no lugar da URL."""
+    digest = hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+def create_temp_token(filme_id: int, url: str, id_token: str = None) -> str:
+    """
+    temp_token compacto: assina [filme_id, hash da URL] com o horário de
+    emissão e, se dado, o identificador do token de API que pediu o link (para
+    os limites de streams).
+    """
+    payload = [filme_id, media_url_hash(url)]
+    if id_token:
+        payload.append(id_token)
+    return signer.dumps(payload)
+
+class TokenVerificado:
+    """
+    temp_token com assinatura já conferida. 'validado' guarda (versão do
+    catálogo, filme_id, URL) da última conferência contra o filme: só é
+    refeita quando a versão muda, para detectar URLs alteradas numa recarga.
+    """
+    __slots__ = ('payload', 'expira_em', 'validado')
+
+    def __init__(self, payload, expira_em: float):
+        self.payload = payload
+        self.expira_em = expira_em
+        self.validado = None
+
+    def confere(self, filme_id: int, url: str) -> bool:
+        if isinstance(self.payload, str):
+            # Tokens emitidos antes do formato compacto (URL inteira) valem até expirar
+            return self.payload == url
+        return (isinstance(self.payload, list) and len(self.payload) in (2, 3) and self.payload[0] == filme_id
+                and isinstance(url, str) and self.payload[1] == media_url_hash(url))
+
+    @property
+    def id_token(self):
+        """Identificador do token de API que emitiu o link (None nos tokens antigos)."""
+        if isinstance(self.payload, list) and len(self.payload) == 3:
+            return self.payload[2]
+        return None
+
+class CacheTokens:
+    """
+    Cache LRU de temp_tokens verificados. Cada entrada expira junto com o
+    token (emissão + TEMPO_EXPIRACAO_LINK); depois disso a verificação volta
+    ao signer, que responde 'expirado'.
+    """
+
+    def __init__(self, max_entradas: int = CACHE_TOKENS_MAX):
+        self.max_entradas = max_entradas
+        self.entradas = OrderedDict()
+        self.lock = threading.Lock()
+        self.metricas = {'hits': 0, 'misses': 0}
+
+    def get(self, temp_token: str):
+        with self.lock:
+            entrada = self.entradas.get(temp_token)
+            if entrada is not None and entrada.expira_em <= time.time():
+                del self.entradas[temp_token]
+                entrada = None
+            if entrada is None:
+                self.metricas['misses'] += 1
+                return None
+            self.entradas.move_to_end(temp_token)
+            self.metricas['hits'] += 1
+            return entrada
+
+    def put(self, temp_token: str, entrada: TokenVerificado):
+        with self.lock:
+            self.entradas[temp_token] = entrada
+            self.entradas.move_to_end(temp_token)
+            while len(self.entradas) > self.max_entradas:
+                self.entradas.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self.metricas, entradas=len(self.entradas))
+
+CACHE_TOKENS = CacheTokens()
+
+def verify_temp_token(temp_token: str) -> TokenVerificado:
+    """Confere a assinatura e a validade do token (ou pega do cache). Propaga SignatureExpired/BadSignature."""
+    entrada = CACHE_TOKENS.get(temp_token)
+    if entrada is None:
+        payload, emitido_em = signer.loads(temp_token, max_age=TEMPO_EXPIRACAO_LINK, return_timestamp=True)
+        entrada = TokenVerificado(payload, emitido_em.timestamp() + TEMPO_EXPIRACAO_LINK)
+        CACHE_TOKENS.put(temp_token, entrada)
+    return entrada
+
+def build_player_link(filme_id: int, filme: dict):
+    """Link temporário completo (proxy + temp_token) do filme; None se ele não tem URL de mídia."""
+    url_sensivel = filme.get('url_m3u8_ou_mp4')
+    if not url_sensivel or url_sensivel == 'N/A':
+        return None
+    base_url = request.url_root.rstrip('/')
+    temp_token = create_temp_token(filme_id, url_sensivel, g.get('id_token'))
+    return f"{base_url}/player_proxy/{filme_id}?temp_token={temp_token}"
+
+# --- ROTA DE PLAYER (RETORNA ARRAY JSON) ---
+
+# Resultados da busca examinados pelo player atrás de uma cópia do filme com link vivo
+PLAYER_CANDIDATOS = 5
+
+def player_candidates(snap, termo: str) -> tuple:
+    """
+    Cópias do melhor resultado da busca ranqueada (mesmo título normalizado,
+    entre os PLAYER_CANDIDATOS primeiros) e, entre elas, as que a sonda não
+    viu fora do ar: (copias, vivas). Listas vazias se nada foi encontrado.
+    """
+    ids, _ = snap.indice_titulos.buscar_ranqueado(termo, limite=PLAYER_CANDIDATOS)
+    if not ids:
+        return [], []
+    titulo_melhor = snap.indice_titulos.titulos[ids[0]]
+    copias = [snap.registros[i] for i in ids if snap.indice_titulos.titulos[i] == titulo_melhor]
+    vivas = [registro for registro in copias if not SONDA.morto(registro.original.get('url_m3u8_ou_mp4'))]
+    return copias, vivas
+
+@app.route('/titulo/<string:titulo_busca>/player', methods=['GET'])
+@require_api_token
+def generate_player_link_by_title(titulo_busca):
+    """
+    Gera o link temporário de 4 horas (URL completa), retornando um ARRAY JSON.
+    Entre cópias do melhor resultado (mesmo título normalizado), as que a
+    sonda viu fora do ar vão para o fim; se todas estão fora, responde 503
+    na hora em vez de mandar o player para um link morto.
+    """
+    termo_busca_normalizado = IndiceTitulos.normalizar_consulta(titulo_busca)
+    
+    filme_encontrado = None
+    filme_id = -1
+    
+    copias, vivas = player_candidates(current_snapshot(), termo_busca_normalizado)
+    if copias:
+        if not vivas:
+            return jsonify({"erro": f"O link de mídia de '{copias[0].original['titulo']}' está fora do ar."}), 503
+        registro = vivas[0]
+        filme_id = registro.filme_id
+        filme_encontrado = registro.original
+
+    if not filme_encontrado:
+        return jsonify({"erro": f"Filme com título '{titulo_busca}' não encontrado."}), 404
+
+    link_temporario = build_player_link(filme_id, filme_encontrado)
+    if link_temporario is None:
+        return jsonify({"erro": f"Filme '{filme_encontrado['titulo']}' não possui URL de mídia (url_m3u8_ou_mp4)."}), 500
+    
+    # Resposta encapsulada em uma lista []
+    resposta_player = [{
+        "status": "sucesso",
+        "filme": filme_encontrado['titulo'],
+        "link_temporario": link_temporario, 
+        "expira_em_segundos": TEMPO_EXPIRACAO_LINK
+    }]
+    
+    return jsonify(resposta_player) 
+
+# --- CONSULTA EM LOTE ---
+
+# Máximo de itens (ids + titulos) por requisição em /lote
+LOTE_MAX_ITENS = int(os.environ.get('LOTE_MAX_ITENS', 100))
+
+@app.route('/lote', methods=['POST'])
+@require_api_token
+def batch_lookup():
+    """
+    Resolve vários filmes numa requisição só. Corpo JSON:
+    {"ids": [3, 10], "titulos": ["vingança"], "player": true}. Retorna um
+    array com um item por entrada (ids primeiro, na ordem pedida): o filme
+    (visão pública), o link temporário se "player" for true, ou "erro" só
+    naquele item. Títulos escolhem a cópia do filme como a rota de player:
+    com "player", se todas as cópias estão fora do ar, o item traz o erro em
+    vez de um link morto.
+    """
+    corpo = request.get_json(silent=True)
+    if not isinstance(corpo, dict):
+        raise ParametroInvalido("Corpo deve ser um objeto JSON com 'ids' e/ou 'titulos'.")
+    ids = corpo.get('ids', [])
+    titulos = corpo.get('titulos', [])
+    if not isinstance(ids, list) or not isinstance(titulos, list):
+        raise ParametroInvalido("'ids' e 'titulos' devem ser listas.")
+    if not ids and not titulos:
+        raise ParametroInvalido("Informe ao menos um item em 'ids' ou 'titulos'.")
+    if len(ids) + len(titulos) > LOTE_MAX_ITENS:
+        raise ParametroInvalido(f"No máximo {LOTE_MAX_ITENS} itens por lote.")
+    com_player = corpo.get('player') is True
+
+    snap = current_snapshot()
+
+    def resolver(item: dict, registro: FilmeRegistro) -> dict:
+        item["filme"] = registro.publico
+        if com_player:
+            link_temporario = build_player_link(registro.filme_id, registro.original)
+            if link_temporario is None:
+                item["erro"] = "Filme não possui URL de mídia (url_m3u8_ou_mp4)."
+            else:
+                item["link_temporario"] = link_temporario
+                item["expira_em_segundos"] = TEMPO_EXPIRACAO_LINK
+        return item
+
+    resultados = []
+    for filme_id in ids:
+        registro = None
+        if isinstance(filme_id, int) and not isinstance(filme_id, bool):
+            registro = snap.registro_por_id(filme_id)
+        if registro is None:
+            resultados.append({"filme_id": filme_id, "erro": "ID de filme inválido."})
+        else:
+            resultados.append(resolver({"filme_id": filme_id}, registro))
+
+    encontrados = {}
+    for titulo in titulos:
+        if not isinstance(titulo, str) or not titulo.strip():
+            resultados.append({"titulo": titulo, "erro": "Título inválido."})
+            continue
+        termo = IndiceTitulos.normalizar_consulta(titulo)
+        if termo not in encontrados:
+            encontrados[termo] = player_candidates(snap, termo)
+        copias, vivas = encontrados[termo]
+        if not copias:
+            resultados.append({"titulo": titulo, "erro": f"Filme com título '{titulo}' não encontrado."})
+        elif com_player and not vivas:
+            resultados.append({"titulo": titulo, "filme": copias[0].publico,
+                               "erro": f"O link de mídia de '{copias[0].original['titulo']}' está fora do ar."})
+        else:
+            resultados.append(resolver({"titulo": titulo}, (vivas or copias)[0]))
+
+    return jsonify(resultados)
+    
+# --- POOL DE CONEXÕES COM AS ORIGENS DE MÍDIA ---
+
+# Conexões keep-alive mantidas por host de origem
+UPSTREAM_POOL_MAXSIZE = int(os.environ.get('UPSTREAM_POOL_MAXSIZE', 32))
+# Máximo de hosts com sessão aberta (as mais antigas são fechadas)
+UPSTREAM_MAX_HOSTS = int(os.environ.get('UPSTREAM_MAX_HOSTS', 64))
+# Timeouts (segundos) para conectar e para cada leitura da origem
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 5))
+UPSTREAM_READ_TIMEOUT = float(os.environ.get('UPSTREAM_READ_TIMEOUT', 30))
+# Novas tentativas, apenas em falhas de conexão de métodos idempotentes
+UPSTREAM_RETRIES = int(os.environ.get('UPSTREAM_RETRIES', 2))
+
+# Tamanho de cada leitura do corpo da origem no proxy (bytes)
+PROXY_CHUNK_SIZE = int(os.environ.get('PROXY_CHUNK_SIZE', 256 * 1024))
+
+# Cabeçalhos hop-by-hop: não são repassados em nenhuma das direções
+HOP_BY_HOP_HEADERS = {
+    'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+    'te', 'trailers', 'transfer-encoding', 'upgrade',
+}
+
+class ConexaoMedida:
+    """Mistura para as conexões do urllib3 que registra o tempo de connect() (TCP + TLS)."""
+
+    def connect(self):
+        inicio = time.perf_counter()
+        super().connect()
+        METRICAS.observe(M_UPSTREAM_CONEXAO, time.perf_counter() - inicio)
+
+class PoolHTTPMedido(HTTPConnectionPool):
+    ConnectionCls = type('ConexaoHTTPMedida', (ConexaoMedida, HTTPConnection), {})
+
+class PoolHTTPSMedido(HTTPSConnectionPool):
+    ConnectionCls = type('ConexaoHTTPSMedida', (ConexaoMedida, HTTPSConnection), {})
+
+POOLS_MEDIDOS = {'http': PoolHTTPMedido, 'https': PoolHTTPSMedido}
+
+class PoolUpstream:
+    """
+    Uma requests.Session por host de origem (scheme + netloc), reaproveitando
+    conexões TCP/TLS entre requisições do proxy (inclusive entre segmentos HLS).
+    """
+
+    def __init__(self, pool_maxsize: int = UPSTREAM_POOL_MAXSIZE, max_hosts: int = UPSTREAM_MAX_HOSTS,
+                 timeout: tuple = (UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT),
+                 retries: int = UPSTREAM_RETRIES):
+        self.pool_maxsize = pool_maxsize
+        self.max_hosts = max_hosts
+        self.timeout = timeout
+        self.retries = retries
+        self.sessoes = OrderedDict()
+        self.requisicoes = {}
+        self.lock = threading.Lock()
+
+    def _nova_sessao(self) -> requests.Session:
+        retry = Retry(
+            total=self.retries, connect=self.retries, read=0, status=0, other=0,
+            allowed_methods=frozenset({'GET', 'HEAD', 'OPTIONS'}),
+            backoff_factor=0.1, raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize, max_retries=retry)
+        adapter.poolmanager.pool_classes_by_scheme = POOLS_MEDIDOS
+        sessao = requests.Session()
+        sessao.mount('http://', adapter)
+        sessao.mount('https://', adapter)
+        return sessao
+
+    def sessao(self, url: str) -> requests.Session:
+        partes = urlsplit(url)
+        host = f"{partes.scheme}://{partes.netloc}"
+        with self.lock:
+            sessao = self.sessoes.get(host)
+            if sessao is None:
+                sessao = self.sessoes[host] = self._nova_sessao()
+                while len(self.sessoes) > self.max_hosts:
+                    _, antiga = self.sessoes.popitem(last=False)
+                    antiga.close()
+            else:
+                self.sessoes.move_to_end(host)
+            self.requisicoes[host] = self.requisicoes.get(host, 0) + 1
+        return sessao
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        resp = self.sessao(url).request(method, url, **kwargs)
+        # Com stream=True, 'elapsed' vai do envio até os cabeçalhos da resposta
+        METRICAS.observe(M_UPSTREAM_TTFB, resp.elapsed.total_seconds())
+        METRICAS.inc(M_UPSTREAM_REQUISICOES, (('status', str(resp.status_code)),))
+        return resp
+
+    def stats(self) -> dict:
+        """Requisições por host e estado dos pools de conexão do urllib3."""
+        with self.lock:
+            sessoes = list(self.sessoes.items())
+            requisicoes = dict(self.requisicoes)
+
+        hosts = {}
+        for host, sessao in sessoes:
+            adapter = sessao.get_adapter(host)
+            pools = [adapter.poolmanager.pools[chave] for chave in adapter.poolmanager.pools.keys()]
+            hosts[host] = {
+                "requisicoes": requisicoes.get(host, 0),
+                "conexoes_abertas": sum(pool.num_connections for pool in pools),
+                "conexoes_ociosas": sum(
+                    1 for pool in pools if pool.pool is not None
+                    for conexao in list(pool.pool.queue) if conexao is not None
+                ),
+                "requisicoes_nas_conexoes": sum(pool.num_requests for pool in pools),
+            }
+        return {
+            "hosts": hosts,
+            "pool_maxsize": self.pool_maxsize,
+            "max_hosts": self.max_hosts,
+            "timeout": list(self.timeout),
+            "retries": self.retries,
+        }
+
+POOL_UPSTREAM = PoolUpstream()
+
+def filter_request_headers(pares) -> dict:
+    """Cabeçalhos do cliente repassados à origem (sem Host e sem hop-by-hop)."""
+    return {key: value for (key, value) in pares
+            if key.lower() != 'host' and key.lower() not in HOP_BY_HOP_HEADERS}
+
+def filter_response_headers(pares) -> list:
+    """Cabeçalhos da origem devolvidos ao cliente (sem hop-by-hop)."""
+    return [(name, value) for name, value in pares if name.lower() not in HOP_BY_HOP_HEADERS]
+
+def upstream_request_headers() -> dict:
+    return filter_request_headers(request.headers)
+
+@app.route('/stats/proxy', methods=['GET'])
+@require_admin_token
+def get_proxy_stats():
+    """
+    Estatísticas do pool de conexões com as origens, do cache de mídia e do
+    cache de tokens. Exige o ADMIN_TOKEN: o pool lista os hosts de origem das
+    mídias, que os tokens de API não devem ver.
+    """
+    stats = POOL_UPSTREAM.stats()
+    stats["cache_midia"] = CACHE_MIDIA.stats()
+    stats["cache_tokens"] = CACHE_TOKENS.stats()
+    stats["sonda"] = SONDA.stats()
+    stats["admissao"] = LIMITADOR.stats()
+    return jsonify(stats)
+
+def snapshot_metrics() -> list:
+    """Gauges e contadores lidos na hora da coleta: catálogo e caches internos."""
+    snap = SNAPSHOT
+    instantaneos = [
+        (M_CATALOGO_FILMES, (), len(snap.registros)),
+        (M_CATALOGO_INFO, (('versao', snap.versao),), 1),
+    ]
+    respostas, tokens, midia = CACHE_RESPOSTAS.stats(), CACHE_TOKENS.stats(), CACHE_MIDIA.stats()
+    for cache, resultado, valor in (
+        ('respostas', 'hit', respostas['hits']), ('respostas', 'miss', respostas['misses']),
+        ('tokens', 'hit', tokens['hits']), ('tokens', 'miss', tokens['misses']),
+        ('midia', 'hit_memoria', midia['hits_memoria']), ('midia', 'hit_disco', midia['hits_disco']),
+        ('midia', 'miss', midia['misses']), ('midia', 'coalescido', midia['coalescidos']),
+    ):
+        instantaneos.append((M_CACHE, (('cache', cache), ('resultado', resultado)), valor))
+    instantaneos.append((M_CACHE_MIDIA_BYTES, (('origem', 'cache'),), midia['bytes_do_cache']))
+    instantaneos.append((M_CACHE_MIDIA_BYTES, (('origem', 'upstream'),), midia['bytes_da_origem']))
+    sonda = SONDA.stats()
+    for estado in ('vivos', 'mortos', 'desconhecidos'):
+        instantaneos.append((M_LINKS, (('estado', estado),), sonda[estado]))
+    return instantaneos
+
+@app.route('/metrics', methods=['GET'])
+@require_api_token
+def get_metrics():
+    """Métricas no formato de exposição do Prometheus (text/plain 0.0.4)."""
+    return Response(METRICAS.render(snapshot_metrics()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# --- MODO HLS: REESCRITA DE PLAYLISTS ---
+
+# Por quanto tempo uma master playlist (sem EXT-X-TARGETDURATION) fica em cache (segundos)
+HLS_MASTER_TTL = float(os.environ.get('HLS_MASTER_TTL', 10))
+# Número máximo de playlists reescritas em cache
+HLS_CACHE_MAX = int(os.environ.get('HLS_CACHE_MAX', 256))
+
+HLS_CONTENT_TYPES = {
+    'application/vnd.apple.mpegurl', 'application/x-mpegurl', 'audio/mpegurl', 'audio/x-mpegurl',
+}
+
+# Atributo URI="..." das tags HLS (EXT-X-KEY, EXT-X-MEDIA, EXT-X-MAP, ...)
+_HLS_URI_ATRIBUTO = re.compile(r'URI="([^"]*)"')
+_HLS_TARGET_DURATION = re.compile(r'^#EXT-X-TARGETDURATION:\s*(\d+(?:\.\d+)?)', re.MULTILINE)
+_HLS_ENDLIST = re.compile(r'^#EXT-X-ENDLIST', re.MULTILINE)
+# Marca onde o temp_token de cada espectador entra na playlist reescrita
+_MARCA_TOKEN = '\0'
+
+class CifraRecursoHLS:
+    """
+    Cifra autenticada e determinística dos recursos HLS [filme_id, url], com
+    AES-SIV (AEAD da biblioteca cryptography; chave de 512 bits derivada da
+    SECRET_KEY_ASSINATURA). O recurso fica opaco (a URL de origem não aparece
+    na playlist reescrita), sem estado no servidor, então qualquer worker o
+    decifra, e a mesma URL gera sempre o mesmo recurso (bom para o cache do
+    player). Recurso adulterado ou de outra chave gera BadSignature.
+    """
+
+    def __init__(self, segredo: str):
+        base = hashlib.sha256(segredo.encode('utf-8')).digest()
+        self.aead = AESSIV(hashlib.blake2b(b'hls-uri', key=base).digest())
+
+    def dumps(self, valor) -> str:
+        texto = json.dumps(valor, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(self.aead.encrypt(texto, None)).decode('ascii').rstrip('=')
+
+    def loads(self, recurso: str):
+        try:
+            dados = base64.urlsafe_b64decode(recurso + '=' * (-len(recurso) % 4))
+            texto = self.aead.decrypt(dados, None)
+        except ValueError:
+            raise BadSignature("Recurso HLS mal formado.")
+        except InvalidTag:
+            raise BadSignature("Recurso HLS adulterado.")
+        return json.loads(texto)
+
+# Cifra as URIs (variantes, segmentos, chaves) das playlists HLS reescritas pelo proxy
+hls_cifra = CifraRecursoHLS(SECRET_KEY_ASSINATURA)
+
+def is_hls_playlist(url: str, resp: requests.Response) -> bool:
+    """A resposta da origem é uma playlist HLS (pelo Content-Type ou pela extensão)?"""
+    content_type = resp.headers.get('Content-Type', '').split(';')[0].strip().lower()
+    caminho = urlsplit(url).path.lower()
+    return content_type in HLS_CONTENT_TYPES or caminho.endswith(('.m3u8', '.m3u'))
+
+class PlaylistHLS:
+    """
+    Playlist HLS (master ou media) já reescrita: cada URI vira um sub-caminho
+    cifrado do proxy. O resultado não depende do espectador; só o temp_token
+    é inserido na hora de responder, então a mesma playlist em cache serve a
+    todos até expirar. Uma media playlist com EXT-X-ENDLIST não muda mais e
+    vale um EXT-X-TARGETDURATION inteiro; uma ao vivo (sem EXT-X-ENDLIST)
+    vale só metade, o intervalo mínimo de recarga do player, para não servir
+    segmentos velhos. Master playlists valem HLS_MASTER_TTL.
+    """
+    __slots__ = ('partes', 'expira_em')
+
+    def __init__(self, texto: str, url_base: str, filme_id: int, prefixo: str):
+        def reescrever(uri: str) -> str:
+            recurso = hls_cifra.dumps([filme_id, urljoin(url_base, uri.strip())])
+            return f"{prefixo}/player_proxy/{filme_id}/hls/{recurso}?temp_token={_MARCA_TOKEN}"
+
+        linhas = []
+        for linha in texto.replace(_MARCA_TOKEN, '').splitlines():
+            if linha.startswith('#'):
+                linha = _HLS_URI_ATRIBUTO.sub(lambda m: f'URI="{reescrever(m.group(1))}"', linha)
+            elif linha.strip():
+                linha = reescrever(linha)
+            linhas.append(linha)
+
+        self.partes = ('\n'.join(linhas) + '\n').split(_MARCA_TOKEN)
+        duracao = _HLS_TARGET_DURATION.search(texto)
+        ttl = max(float(duracao.group(1)) if duracao else HLS_MASTER_TTL, 1.0)
+        if duracao and not _HLS_ENDLIST.search(texto):
+            ttl /= 2
+        self.expira_em = time.monotonic() + ttl
+
+    def render(self, temp_token: str) -> str:
+        return quote(temp_token, safe='').join(self.partes)
+
+class CachePlaylists:
+    """Cache LRU de PlaylistHLS por (filme_id, URL de origem, prefixo), respeitando a expiração de cada uma."""
+
+    def __init__(self, max_entradas: int = HLS_CACHE_MAX):
+        self.max_entradas = max_entradas
+        self.entradas = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, chave):
+        with self.lock:
+            playlist = self.entradas.get(chave)
+            if playlist is None:
+                return None
+            if playlist.expira_em <= time.monotonic():
+                del self.entradas[chave]
+                return None
+            self.entradas.move_to_end(chave)
+            return playlist
+
+    def put(self, chave, playlist: PlaylistHLS):
+        with self.lock:
+            self.entradas[chave] = playlist
+            self.entradas.move_to_end(chave)
+            while len(self.entradas) > self.max_entradas:
+                self.entradas.popitem(last=False)
+
+CACHE_PLAYLISTS = CachePlaylists()
+
+def playlist_response(playlist: PlaylistHLS, temp_token: str) -> Response:
+    return Response(playlist.render(temp_token), mimetype='application/vnd.apple.mpegurl')
+
+# --- CACHE COMPARTILHADO DE SEGMENTOS / BYTES DE MÍDIA ---
+
+# Orçamento do cache em memória (bytes)
+CACHE_MIDIA_MEMORIA_BYTES = int(os.environ.get('CACHE_MIDIA_MEMORIA_BYTES', 64 * 1024 * 1024))
+# Diretório do cache em disco (desligado se vazio) e seu orçamento (bytes)
+CACHE_MIDIA_DIR = os.environ.get('CACHE_MIDIA_DIR', '')
+CACHE_MIDIA_DISCO_BYTES = int(os.environ.get('CACHE_MIDIA_DISCO_BYTES', 1024 * 1024 * 1024))
+# Respostas maiores que isso (ex: um MP4 inteiro) não são guardadas, só repassadas
+CACHE_MIDIA_MAX_OBJETO = int(os.environ.get('CACHE_MIDIA_MAX_OBJETO', 16 * 1024 * 1024))
+# Validade máxima de cada objeto (segundos; um max-age menor da origem prevalece) e espera
+# máxima por um fetch em andamento
+CACHE_MIDIA_TTL = float(os.environ.get('CACHE_MIDIA_TTL', 3600))
+CACHE_MIDIA_ESPERA = float(os.environ.get('CACHE_MIDIA_ESPERA', 30))
+
+# Cabeçalhos condicionais: a resposta depende do que o cliente já tem, então não usamos o cache
+CABECALHOS_CONDICIONAIS = ('If-Range', 'If-None-Match', 'If-Modified-Since', 'If-Match', 'If-Unmodified-Since')
+
+class ObjetoMidia:
+    """Resposta da origem guardada no cache: status, cabeçalhos, corpo cru e validade (segundos)."""
+    __slots__ = ('status', 'cabecalhos', 'corpo', 'criado_em', 'validade')
+
+    def __init__(self, status: int, cabecalhos: list, corpo: bytes, criado_em: float = None,
+                 validade: float = None):
+        self.status = status
+        self.cabecalhos = cabecalhos
+        self.corpo = corpo
+        self.criado_em = time.time() if criado_em is None else criado_em
+        self.validade = CACHE_MIDIA_TTL if validade is None else validade
+
+    def expirado(self) -> bool:
+        return time.time() - self.criado_em > self.validade
+
+    def response(self) -> Response:
+        return Response(self.corpo, status=self.status, headers=self.cabecalhos)
+
+    def serializar(self) -> bytes:
+        meta = json.dumps({"status": self.status, "cabecalhos": self.cabecalhos,
+                           "criado_em": self.criado_em, "validade": self.validade}).encode('utf-8')
+        return struct.pack('<I', len(meta)) + meta + self.corpo
 
-# TEMPO DE EXPIRAÇÃO DO LINK: 4 horas = 4 * 3600 = 14400 segundos
-TEMPO_EXPIRACAO_LINK = 14400 
+    @classmethod
+    def desserializar(cls, dados: bytes) -> 'ObjetoMidia':
+        tamanho_meta, = struct.unpack_from('<I', dados, 0)
+        meta = json.loads(dados[4:4 + tamanho_meta])
+        cabecalhos = [tuple(c) for c in meta['cabecalhos']]
+        return cls(meta['status'], cabecalhos, dados[4 + tamanho_meta:], meta['criado_em'], meta.get('validade'))
 
-# CHAVE SECRETA para assinar/validar links temporários. Mude este valor!
-SECRET_KEY_ASSINATURA = "sua_chave_secreta_para_assinatura_de_links_XYZ"
+class CacheMidia:
+    """
+    Cache de segmentos/intervalos de bytes na frente da origem, por (URL, Range).
+    Camada LRU em memória com orçamento de bytes e, opcionalmente, uma camada
+    em disco (também LRU, com orçamento próprio). Misses simultâneos da mesma
+    chave viram um único fetch (single-flight): os demais esperam o primeiro.
+    """
 
-signer = URLSafeTimedSerializer(SECRET_KEY_ASSINATURA, salt='media-access-salt')
+    def __init__(self, memoria_bytes: int = CACHE_MIDIA_MEMORIA_BYTES, diretorio: str = CACHE_MIDIA_DIR,
+                 disco_bytes: int = CACHE_MIDIA_DISCO_BYTES):
+        self.memoria_bytes = memoria_bytes
+        self.diretorio = diretorio
+        self.disco_bytes = disco_bytes
+        self.memoria = OrderedDict()
+        self.bytes_memoria = 0
+        self.disco = OrderedDict()
+        self.bytes_disco = 0
+        self.em_andamento = {}
+        self.lock = threading.Lock()
+        self.metricas = dict.fromkeys((
+            'hits_memoria', 'hits_disco', 'misses', 'coalescidos', 'nao_cacheaveis',
+            'bytes_do_cache', 'bytes_da_origem', 'despejos_memoria', 'despejos_disco',
+        ), 0)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+            self._carregar_indice_disco()
 
-# Defina o caractere que separa os gêneros no seu 'filmes_capturados.json'
-SPLIT_CHAR = ',' 
-# ------------------------------------------------------------------------
+    def _carregar_indice_disco(self):
+        """Reconstrói o LRU do disco a partir dos arquivos existentes (mais antigos primeiro)."""
+        arquivos = []
+        for nome in os.listdir(self.diretorio):
+            if nome.endswith('.obj'):
+                st = os.stat(os.path.join(self.diretorio, nome))
+                arquivos.append((st.st_mtime, nome, st.st_size))
+        for _, nome, tamanho in sorted(arquivos):
+            self.disco[nome] = tamanho
+            self.bytes_disco += tamanho
 
-# Nomes dos arquivos de dados
-DATA_FILE = 'filmes_capturados.json'
-TOKENS_FILE = 'api_tokens.json'
+    @staticmethod
+    def _nome_arquivo(chave) -> str:
+        return hashlib.sha1(repr(chave).encode('utf-8')).hexdigest() + '.obj'
 
-# --- Funções Auxiliares de Dados e Autenticação ---
+    def _contar(self, metrica: str, valor: int = 1):
+        self.metricas[metrica] += valor
 
-def load_data():
-    """Carrega os dados dos filmes e categorias."""
-    try:
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data['filmes'], data['categorias_capturadas']
-    except Exception as e:
-        print(f"ERRO: Falha ao carregar {DATA_FILE}: {e}")
-        return [], []
+    def get(self, chave):
+        with self.lock:
+            objeto = self.memoria.get(chave)
+            if objeto is not None and not objeto.expirado():
+                self.memoria.move_to_end(chave)
+                self._contar('hits_memoria')
+                self._contar('bytes_do_cache', len(objeto.corpo))
+                return objeto
 
-def load_tokens():
-    """Carrega os tokens válidos do arquivo JSON (tokens de acesso à API)."""
+        objeto = self._ler_disco(chave)
+        if objeto is not None:
+            self._guardar_memoria(chave, objeto)
+            with self.lock:
+                self._contar('hits_disco')
+                self._contar('bytes_do_cache', len(objeto.corpo))
+        return objeto
+
+    def put(self, chave, objeto: ObjetoMidia):
+        self._guardar_memoria(chave, objeto)
+        self._gravar_disco(chave, objeto)
+
+    def _guardar_memoria(self, chave, objeto: ObjetoMidia):
+        tamanho = len(objeto.corpo)
+        if tamanho > self.memoria_bytes:
+            return
+        with self.lock:
+            antigo = self.memoria.pop(chave, None)
+            if antigo is not None:
+                self.bytes_memoria -= len(antigo.corpo)
+            self.memoria[chave] = objeto
+            self.bytes_memoria += tamanho
+            while self.bytes_memoria > self.memoria_bytes:
+                _, despejado = self.memoria.popitem(last=False)
+                self.bytes_memoria -= len(despejado.corpo)
+                self._contar('despejos_memoria')
+
+    def _ler_disco(self, chave):
+        if not self.diretorio:
+            return None
+        nome = self._nome_arquivo(chave)
+        with self.lock:
+            if nome not in self.disco:
+                return None
+            self.disco.move_to_end(nome)
+        try:
+            with open(os.path.join(self.diretorio, nome), 'rb') as f:
+                objeto = ObjetoMidia.desserializar(f.read())
+        except (OSError, ValueError, struct.error):
+            return None
+        return None if objeto.expirado() else objeto
+
+    def _gravar_disco(self, chave, objeto: ObjetoMidia):
+        if not self.diretorio:
+            return
+        dados = objeto.serializar()
+        if len(dados) > self.disco_bytes:
+            return
+        nome = self._nome_arquivo(chave)
+        caminho = os.path.join(self.diretorio, nome)
+        try:
+            temporario = f"{caminho}.{threading.get_ident()}.tmp"
+            with open(temporario, 'wb') as f:
+                f.write(dados)
+            os.replace(temporario, caminho)
+        except OSError:
+            return
+
+        despejados = []
+        with self.lock:
+            self.bytes_disco += len(dados) - self.disco.pop(nome, 0)
+            self.disco[nome] = len(dados)
+            while self.bytes_disco > self.disco_bytes:
+                antigo, tamanho = self.disco.popitem(last=False)
+                self.bytes_disco -= tamanho
+                despejados.append(antigo)
+                self._contar('despejos_disco')
+        for antigo in despejados:
+            try:
+                os.remove(os.path.join(self.diretorio, antigo))
+            except OSError:
+                pass
+
+    def iniciar_fetch(self, chave) -> tuple:
+        """
+        Single-flight: (True, evento) para quem deve buscar na origem; (False,
+        evento) para quem deve esperar o fetch já em andamento.
+        """
+        with self.lock:
+            evento = self.em_andamento.get(chave)
+            if evento is not None:
+                self._contar('coalescidos')
+                return False, evento
+            evento = self.em_andamento[chave] = threading.Event()
+            self._contar('misses')
+            return True, evento
+
+    def terminar_fetch(self, chave, cacheado: bool):
+        """Libera quem espera a chave; 'cacheado' diz se eles vão encontrar o resultado no cache."""
+        with self.lock:
+            evento = self.em_andamento.pop(chave, None)
+        if evento is not None:
+            evento.cacheado = cacheado
+            evento.set()
+
+    def stats(self) -> dict:
+        with self.lock:
+            metricas = dict(self.metricas)
+            metricas.update({
+                "objetos_memoria": len(self.memoria),
+                "bytes_memoria": self.bytes_memoria,
+                "orcamento_memoria": self.memoria_bytes,
+                "objetos_disco": len(self.disco),
+                "bytes_disco": self.bytes_disco,
+                "orcamento_disco": self.disco_bytes if self.diretorio else 0,
+                "fetches_em_andamento": len(self.em_andamento),
+            })
+        consultas = metricas['hits_memoria'] + metricas['hits_disco'] + metricas['misses'] + metricas['coalescidos']
+        metricas['taxa_acerto'] = round((consultas - metricas['misses']) / consultas, 4) if consultas else 0.0
+        return metricas
+
+CACHE_MIDIA = CacheMidia()
+
+def media_cache_key(url: str):
+    """
+    Chave do cache de mídia para a requisição atual, ou None se ela não pode
+    usar o cache. O Accept-Encoding fica de fora porque o fetch cacheável pede
+    'identity' à origem (ver cacheable_request_headers).
+    """
+    if request.method != 'GET' or any(h in request.headers for h in CABECALHOS_CONDICIONAIS):
+        return None
+    return (url, request.headers.get('Range'))
+
+def cacheable_request_headers(cabecalhos: dict) -> dict:
+    """Cabeçalhos do fetch que vai para o cache: corpo sem codificação, servível a qualquer cliente."""
+    cabecalhos = {k: v for k, v in cabecalhos.items() if k.lower() != 'accept-encoding'}
+    cabecalhos['Accept-Encoding'] = 'identity'
+    return cabecalhos
+
+def media_cache_lifetime(cabecalhos) -> float:
+    """
+    Por quanto tempo (segundos) a resposta pode ficar no cache, segundo o
+    Cache-Control da origem: 0 com no-store, no-cache, private ou max-age=0;
+    s-maxage/max-age limitam o CACHE_MIDIA_TTL.
+    """
+    diretivas = {}
+    for diretiva in cabecalhos.get('Cache-Control', '').lower().split(','):
+        nome, _, valor = diretiva.strip().partition('=')
+        diretivas[nome] = valor.strip().strip('"')
+    if diretivas.keys() & {'no-store', 'no-cache', 'private'}:
+        return 0
+    for nome in ('s-maxage', 'max-age'):
+        if nome in diretivas:
+            valor = diretivas[nome]
+            return min(int(valor), CACHE_MIDIA_TTL) if valor.isascii() and valor.isdigit() else 0
+    return CACHE_MIDIA_TTL
+
+def is_cacheable(resp) -> bool:
+    """
+    Só respostas completas/parciais com tamanho conhecido e limitado, sem
+    codificação, sem Vary além de Accept-Encoding e que o Cache-Control
+    deixa guardar entram no cache.
+    """
+    tamanho = resp.headers.get('Content-Length', '')
+    codificacao = resp.headers.get('Content-Encoding', 'identity').strip().lower()
+    vary = {nome.strip().lower() for nome in resp.headers.get('Vary', '').split(',') if nome.strip()}
+    return (resp.status_code in (200, 206) and tamanho.isascii() and tamanho.isdigit()
+            and int(tamanho) <= CACHE_MIDIA_MAX_OBJETO and codificacao == 'identity'
+            and vary <= {'accept-encoding'} and media_cache_lifetime(resp.headers) > 0)
+
+# Resposta quando a origem encerra um corpo que seria guardado antes do Content-Length anunciado
+MENSAGEM_CORPO_INCOMPLETO = "A fonte de mídia encerrou a resposta antes do fim."
+
+def serve_upstream(filme_id: int, url: str, temp_token: str):
+    """
+    Serve a mídia de 'url': playlists HLS reescritas (em cache), segmentos e
+    intervalos do CACHE_MIDIA ou, no miss, da origem. Enquanto um fetch de
+    uma chave está em andamento, as outras requisições da mesma chave esperam
+    por ele em vez de irem também à origem.
+    """
+    chave_playlist = (filme_id, url, request.script_root)
+    chave = media_cache_key(url)
+    lider = False
+
+    while chave is not None:
+        playlist = CACHE_PLAYLISTS.get(chave_playlist)
+        if playlist is not None:
+            return playlist_response(playlist, temp_token)
+        objeto = CACHE_MIDIA.get(chave)
+        if objeto is not None:
+            return objeto.response()
+
+        lider, evento = CACHE_MIDIA.iniciar_fetch(chave)
+        if lider:
+            break
+        # Espera o fetch em andamento; se ele demorar demais ou não gerar nada cacheável, busca direto
+        if not evento.wait(CACHE_MIDIA_ESPERA) or not evento.cacheado:
+            break
+
+    if not lider:
+        return fetch_upstream(filme_id, url, temp_token)[0]
+
+    cacheado = False
     try:
-        with open(TOKENS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return set(data.get('valid_tokens', [])) 
-    except Exception:
-        return set()
+        resposta, cacheado = fetch_upstream(filme_id, url, temp_token, chave)
+        return resposta
+    finally:
+        CACHE_MIDIA.terminar_fetch(chave, cacheado)
 
-def filter_movie_data(movie: dict) -> dict:
+def fetch_upstream(filme_id: int, url: str, temp_token: str, chave=None) -> tuple:
     """
-    Remove chaves sensíveis/internas (EXCETO url_m3u8_ou_mp4), LIMPA AS URLS, 
-    cria a chave 'tipo' baseada na URL, e converte o valor de 'generos' para MAIÚSCULO.
+    Busca na origem; com 'chave', guarda a resposta no CACHE_MIDIA quando ela é
+    cacheável. Devolve (resposta, se algo foi guardado em cache).
     """
-    EXCLUDE_KEYS = ['url_player_pagina', 'url_filme']
-    URL_KEYS_TO_CLEAN = ['url_capa', 'url_poster'] 
+    headers = upstream_request_headers()
+    if chave is not None:
+        headers = cacheable_request_headers(headers)
     
-    filtered_movie = movie.copy()
-    
-    # 1. Remove chaves sensíveis (url_m3u8_ou_mp4 é mantida)
-    for key in EXCLUDE_KEYS:
-        filtered_movie.pop(key, None)
-        
-    # 2. Limpa as aspas simples extras das URLs
-    for key in URL_KEYS_TO_CLEAN:
-        if key in filtered_movie and isinstance(filtered_movie[key], str):
-            # O método .strip("'") remove a aspa simples no início e no fim da string
-            filtered_movie[key] = filtered_movie[key].strip("'")
-            
-    # 3. Garante que o valor de 'generos' venha em MAIÚSCULO
-    if 'generos' in filtered_movie and isinstance(filtered_movie['generos'], str):
-        filtered_movie['generos'] = filtered_movie['generos'].upper()
+    resp = POOL_UPSTREAM.request(
+        method=request.method,
+        url=url,
+        headers=headers,
+        data=request.get_data(),
+        stream=True, 
+        allow_redirects=False
+    )
 
-    # 4. [ÚLTIMA MODIFICAÇÃO] Cria a chave "tipo" baseada na URL de mídia
-    url_midia = filtered_movie.get('url_m3u8_ou_mp4', '').lower()
-    tipo = 'desconhecido'
-    
-    if url_midia:
-        if 'm3u8' in url_midia:
-            tipo = 'm3u8'
-        elif 'm3u' in url_midia:
-            tipo = 'm3u'
-        elif 'mp4' in url_midia:
-            tipo = 'mp4'
-        elif 'drive.google' in url_midia or 'driver' in url_midia:
-            tipo = 'driver' 
+    if request.method == 'GET' and resp.status_code == 200 and is_hls_playlist(url, resp):
+        try:
+            texto = resp.text
+        finally:
+            resp.close()
+        METRICAS.inc(M_UPSTREAM_BYTES, valor=len(resp.content))
+        playlist = PlaylistHLS(texto, url, filme_id, request.script_root)
+        CACHE_PLAYLISTS.put((filme_id, url, request.script_root), playlist)
+        return playlist_response(playlist, temp_token), True
     
-    # Adiciona a nova chave "tipo" ao objeto filtrado
-    filtered_movie['tipo'] = tipo
-            
-    return filtered_movie
+    response_headers = filter_response_headers(resp.raw.headers.items())
 
-# Carregamento global na inicialização
-FILMES, CATEGORIAS_COMPLETAS = load_data()
-VALID_TOKENS = load_tokens()
+    if chave is not None and is_cacheable(resp):
+        try:
+            corpo = resp.raw.read(decode_content=False)
+        except ErroUrllib3:
+            # Origem caiu no meio do corpo (IncompleteRead, timeout de leitura...)
+            corpo = None
+        finally:
+            resp.close()
+        # Corpo curto com o Content-Length original travaria o cliente: melhor um erro que ele possa repetir
+        if corpo is None or len(corpo) != int(resp.headers['Content-Length']):
+            return app.make_response((jsonify({"erro": MENSAGEM_CORPO_INCOMPLETO}), 502)), False
+        with CACHE_MIDIA.lock:
+            CACHE_MIDIA.metricas['bytes_da_origem'] += len(corpo)
+        METRICAS.inc(M_UPSTREAM_BYTES, valor=len(corpo))
+        objeto = ObjetoMidia(resp.status_code, response_headers, corpo, validade=media_cache_lifetime(resp.headers))
+        CACHE_MIDIA.put(chave, objeto)
+        return objeto.response(), True
 
-CATEGORIAS_NORM = {
-    unidecode(cat).lower(): cat
-    for cat in CATEGORIAS_COMPLETAS
-}
+    if chave is not None:
+        with CACHE_MIDIA.lock:
+            CACHE_MIDIA.metricas['nao_cacheaveis'] += 1
 
-def require_api_token(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        auth_header = request.headers.get('Authorization')
-        token = auth_header.split(' ')[1] if auth_header and auth_header.startswith('Bearer ') else None
-        if not token:
-            token = request.args.get('token')
-            
-        if token and token in VALID_TOKENS:
-            return f(*args, **kwargs)
-        else:
-            return jsonify({"erro": "Acesso negado. Token de API inválido ou ausente."}), 401
-            
-    return decorated
+    if request.method == 'HEAD':
+        resp.close()
+        corpo = []
+    else:
+        corpo = count_upstream_bytes(resp.raw.stream(PROXY_CHUNK_SIZE, decode_content=False))
+                        
+    resposta = Response(
+        corpo, 
+        status=resp.status_code,
+        headers=response_headers,
+        content_type=resp.headers.get('Content-Type')
+    )
+    # Devolve a conexão ao pool (ou a descarta) quando o cliente termina/desconecta
+    resposta.call_on_close(resp.close)
+    return resposta, False
 
-# --- ROTAS DE LISTAGEM E BUSCA (ARRAY JSON) ---
+# --- SONDA DE SAÚDE DOS LINKS DE MÍDIA ---
 
-@app.route('/', methods=['GET'])
-@require_api_token
-def get_all_content():
-    """Lista todos os filmes com ID e dados filtrados (retorna um array direto)."""
-    filmes_com_id = []
-    for i, filme in enumerate(FILMES):
-        filme_filtrado = filter_movie_data(filme)
-        filme_filtrado['filme_id'] = i
-        filmes_com_id.append(filme_filtrado)
-        
-    return jsonify(filmes_com_id)
+# Intervalo entre rodadas da sonda (segundos); 0 desliga (ex: serverless)
+SONDA_INTERVALO = float(os.environ.get('SONDA_INTERVALO', 0))
+# Sondagens simultâneas numa rodada
+SONDA_CONCORRENCIA = int(os.environ.get('SONDA_CONCORRENCIA', 16))
+# Timeout de conexão e de leitura de cada sondagem (segundos)
+SONDA_TIMEOUT = float(os.environ.get('SONDA_TIMEOUT', 5))
+# Por quanto tempo um resultado vale; depois disso o link volta a ser "desconhecido" (segundos)
+SONDA_VALIDADE = float(os.environ.get('SONDA_VALIDADE', 3600))
+# Máximo de filme_ids listados em cada exemplo do /stats/proxy
+SONDA_EXEMPLOS_MAX = 50
+# Arquivo em que o único processo que sonda publica os resultados para os demais workers
+# (o '<arquivo>.lock' ao lado elege quem sonda); vazio = cada processo sonda por conta própria
+SONDA_ARQUIVO = os.environ.get('SONDA_ARQUIVO', 'sonda_links.json')
+# De quanto em quanto tempo os outros processos releem o arquivo (e tentam assumir a sonda)
+SONDA_LEITURA = 5
 
-@app.route('/categorias', methods=['GET'])
-@require_api_token
-def get_all_categories():
+# Content-Types esperados para cada 'tipo' declarado (os demais tipos não são conferidos)
+CONTENT_TYPES_POR_TIPO = {'mp4': {'video/mp4'}, 'm3u8': HLS_CONTENT_TYPES, 'm3u': HLS_CONTENT_TYPES}
+
+class EstadoLink:
+    """Resultado da última sondagem de uma URL de mídia."""
+    __slots__ = ('filme_id', 'vivo', 'status', 'latencia', 'content_type', 'tamanho', 'tipo_confere',
+                 'erro', 'verificado_em')
+
+    def __init__(self, filme_id: int, vivo: bool, status: int = None, latencia: float = None,
+                 content_type: str = None, tamanho: int = None, tipo_confere: bool = None, erro: str = None):
+        self.filme_id = filme_id
+        self.vivo = vivo
+        self.status = status
+        self.latencia = latencia
+        self.content_type = content_type
+        self.tamanho = tamanho
+        self.tipo_confere = tipo_confere
+        self.erro = erro
+        self.verificado_em = time.time()
+
+    def para_lista(self) -> list:
+        return [getattr(self, campo) for campo in self.__slots__]
+
+    @classmethod
+    def de_lista(cls, valores: list) -> 'EstadoLink':
+        estado = cls.__new__(cls)
+        for campo, valor in zip(cls.__slots__, valores):
+            setattr(estado, campo, valor)
+        return estado
+
+def create_probe_session(concorrencia: int = SONDA_CONCORRENCIA) -> requests.Session:
     """
-    Lista todas as categorias, retornando um Array JSON de objetos no formato [{"cat": "nome_categoria"}].
+    Session só da sonda, separada do POOL_UPSTREAM: as sondagens não entram nas
+    métricas de upstream do proxy nem despejam do LRU de hosts as sessões que
+    o proxy mantém abertas. Até 'concorrencia' conexões por host, já que as
+    sondagens costumam ir todas para o mesmo CDN. Sem retries: uma falha é
+    resultado da sondagem.
     """
-    # MODIFICAÇÃO: Converte a lista simples em uma lista de objetos {"cat": ...}
-    categorias_formatadas = [{"cat": c} for c in CATEGORIAS_COMPLETAS]
-    
-    return jsonify(categorias_formatadas)
-    
-@app.route('/<string:categoria_ou_genero>', methods=['GET'])
-@require_api_token
-def get_content_by_category(categoria_ou_genero):
-    """Filtra por gênero (retorna um array direto)."""
-    termo_normalizado = unidecode(categoria_ou_genero).strip().lower()
-    resultados = []
-    
-    for i, filme in enumerate(FILMES):
-        generos_filme = filme.get('generos', '')
-        generos_norm_filme = [unidecode(g).strip().lower() for g in generos_filme.split(SPLIT_CHAR)]
-        
-        if termo_normalizado in generos_norm_filme:
-            filme_filtrado = filter_movie_data(filme)
-            filme_filtrado['filme_id'] = i
-            resultados.append(filme_filtrado)
+    adapter = HTTPAdapter(pool_connections=concorrencia, pool_maxsize=concorrencia, max_retries=0)
+    sessao = requests.Session()
+    sessao.mount('http://', adapter)
+    sessao.mount('https://', adapter)
+    return sessao
 
-    if not resultados:
-        return jsonify({
-            "mensagem": f"Nenhum conteúdo encontrado para: {categoria_ou_genero}",
-            "filmes": []
-        }), 404
-        
-    return jsonify(resultados)
+def probe_media_url(filme_id: int, url: str, tipo: str, sessao: requests.Session) -> EstadoLink:
+    """
+    HEAD na URL de mídia (e, se a origem recusar HEAD, um GET de 1 byte via
+    Range). Vivo = status < 400. O Content-Type é conferido com o 'tipo'
+    declarado quando ele é mp4/m3u8/m3u.
+    """
+    inicio = time.perf_counter()
+    timeout = (SONDA_TIMEOUT, SONDA_TIMEOUT)
+    try:
+        resp = sessao.head(url, allow_redirects=True, timeout=timeout)
+        resp.close()
+        if resp.status_code in (403, 405, 501):
+            resp = sessao.get(url, headers={'Range': 'bytes=0-0'}, stream=True, allow_redirects=True, timeout=timeout)
+            resp.close()
+    except requests.exceptions.RequestException as e:
+        return EstadoLink(filme_id, False, latencia=time.perf_counter() - inicio, erro=type(e).__name__)
 
+    content_type = resp.headers.get('Content-Type', '').split(';')[0].strip().lower() or None
+    intervalo = re.match(r'bytes \d+-\d+/(\d+)$', resp.headers.get('Content-Range', ''))
+    if intervalo:
+        tamanho = int(intervalo[1])
+    elif resp.status_code == 200 and resp.headers.get('Content-Length', '').isascii() \
+            and resp.headers['Content-Length'].isdigit():
+        tamanho = int(resp.headers['Content-Length'])
+    else:
+        tamanho = None
+    esperados = CONTENT_TYPES_POR_TIPO.get(tipo)
+    vivo = resp.status_code < 400
+    return EstadoLink(
+        filme_id, vivo, resp.status_code, time.perf_counter() - inicio, content_type, tamanho,
+        tipo_confere=(content_type in esperados) if esperados and vivo and content_type else None,
+    )
 
-@app.route('/titulo/<string:titulo_busca>', methods=['GET'])
-@require_api_token
-def get_content_by_title(titulo_busca):
-    """Busca por título (retorna um array direto)."""
-    titulo_busca_decoded = unquote(titulo_busca)
-    termo_busca_normalizado = unidecode(titulo_busca_decoded).strip().lower().replace('+', ' ')
-    
-    resultados = []
-    for i, filme in enumerate(FILMES):
-        titulo_filme_normalizado = unidecode(filme.get('titulo', '')).strip().lower()
+class SondaLinks:
+    """
+    Verifica em segundo plano a URL de mídia de todos os filmes do snapshot
+    atual, com no máximo 'concorrencia' sondagens simultâneas, e guarda o
+    resultado por URL. Links sem resultado válido contam como vivos: a sonda
+    só tira do caminho o que ela viu falhar. 'versao' muda sempre que um link
+    passa a contar como morto (ou deixa de contar), para o cache de respostas
+    filtradas por '?vivos=1'.
 
-        if termo_busca_normalizado in titulo_filme_normalizado:
-            filme_filtrado = filter_movie_data(filme)
-            filme_filtrado['filme_id'] = i 
-            
-            resultados.append(filme_filtrado)
+    Com vários workers, só o processo que trava '<arquivo>.lock' sonda; ao fim
+    de cada rodada ele publica os resultados (e a 'versao') em 'arquivo', que
+    os demais releem quando muda. Assim todos os workers filtram '?vivos=1'
+    igual, e se o processo que sonda morrer, outro assume a trava.
+    """
 
-    if not resultados:
-        return jsonify({
-            "mensagem": f"Nenhum conteúdo encontrado para o título: {titulo_busca}",
-            "filmes": []
-        }), 404
-        
-    return jsonify(resultados)
+    def __init__(self, intervalo: float = SONDA_INTERVALO, concorrencia: int = SONDA_CONCORRENCIA,
+                 validade: float = SONDA_VALIDADE, arquivo: str = SONDA_ARQUIVO):
+        self.intervalo = intervalo
+        self.concorrencia = concorrencia
+        self.validade = validade
+        self.arquivo = arquivo
+        self.estados = {}
+        self.versao = 0
+        self.rodadas = 0
+        self.duracao_ultima_rodada = None
+        self.lock = threading.Lock()
+        self.thread = None
+        self.sessao = None
+        self.trava = None
+        self.sondando = False
+        self.assinatura_arquivo = None
 
+    def estado(self, url: str) -> EstadoLink:
+        """Último resultado ainda válido para a URL (ou None)."""
+        estado = self.estados.get(url)
+        if estado is None or time.time() - estado.verificado_em > self.validade:
+            return None
+        return estado
 
-@app.route('/ano/<string:ano_busca>', methods=['GET'])
-@require_api_token
-def get_content_by_year(ano_busca):
-    """Busca por ano (retorna um array direto)."""
-    ano_normalizado = ano_busca.strip()
-    resultados = []
-    
-    for i, filme in enumerate(FILMES):
-        if filme.get('ano', '').strip() == ano_normalizado:
-            filme_filtrado = filter_movie_data(filme)
-            filme_filtrado['filme_id'] = i
-            resultados.append(filme_filtrado)
+    def morto(self, url: str) -> bool:
+        estado = self.estado(url)
+        return estado is not None and not estado.vivo
 
-    if not resultados:
-        return jsonify({
-            "mensagem": f"Nenhum conteúdo encontrado para o ano: {ano_busca}",
-            "filmes": []
-        }), 404
-        
-    return jsonify(resultados)
+    def registrar(self, url: str, estado: EstadoLink):
+        with self.lock:
+            anterior = self.estados.get(url)
+            self.estados[url] = estado
+            if (anterior is not None and not anterior.vivo) != (not estado.vivo):
+                self.versao += 1
 
-# --- ROTA DE PLAYER (RETORNA ARRAY JSON) ---
+    def rodada(self, snap: CatalogoSnapshot = None):
+        """Sonda todos os links do catálogo (os nunca vistos e os mais antigos primeiro)."""
+        snap = snap or SNAPSHOT
+        inicio = time.perf_counter()
+        links = {}
+        for registro in snap.registros:
+            url = registro.original.get('url_m3u8_ou_mp4')
+            if isinstance(url, str) and url.startswith(('http://', 'https://')) and url not in links:
+                links[url] = (registro.filme_id, registro.publico.get('tipo'))
 
-@app.route('/titulo/<string:titulo_busca>/player', methods=['GET'])
-@require_api_token
-def generate_player_link_by_title(titulo_busca):
-    """Gera o link temporário de 4 horas (URL completa), retornando um ARRAY JSON."""
-    titulo_busca_decoded = unquote(titulo_busca)
-    termo_busca_normalizado = unidecode(titulo_busca_decoded).strip().lower().replace('+', ' ')
-    
-    filme_encontrado = None
-    filme_id = -1
-    
-    for i, filme in enumerate(FILMES):
-        titulo_filme_normalizado = unidecode(filme.get('titulo', '')).strip().lower()
-        if termo_busca_normalizado in titulo_filme_normalizado:
-            filme_encontrado = filme
-            filme_id = i
-            break
+        if self.sessao is None:
+            self.sessao = create_probe_session(self.concorrencia)
 
-    if not filme_encontrado:
-        return jsonify({"erro": f"Filme com título '{titulo_busca}' não encontrado."}), 404
+        def sondar(url):
+            filme_id, tipo = links[url]
+            return probe_media_url(filme_id, url, tipo, self.sessao)
 
-    url_sensivel = filme_encontrado.get('url_m3u8_ou_mp4')
-    if not url_sensivel or url_sensivel == 'N/A':
-        return jsonify({"erro": f"Filme '{filme_encontrado['titulo']}' não possui URL de mídia (url_m3u8_ou_mp4)."}), 500
+        fila = sorted(links, key=lambda url: self.estados[url].verificado_em if url in self.estados else 0)
+        with ThreadPoolExecutor(max_workers=self.concorrencia) as executor:
+            for url, estado in zip(fila, executor.map(sondar, fila)):
+                self.registrar(url, estado)
+
+        with self.lock:
+            for url in [url for url in self.estados if url not in links]:
+                del self.estados[url]
+            self.rodadas += 1
+            self.duracao_ultima_rodada = time.perf_counter() - inicio
+
+    def assumir(self) -> bool:
+        """Tenta virar o processo que sonda (trava exclusiva em '<arquivo>.lock', mantida até ele morrer)."""
+        if self.trava is not None or not self.arquivo or fcntl is None:
+            return True
+        try:
+            trava = open(f"{self.arquivo}.lock", 'a')
+        except OSError as e:
+            print(f"AVISO: Sem acesso a {self.arquivo}.lock ({e}); este processo sonda por conta própria.")
+            return True
+        try:
+            fcntl.flock(trava, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            trava.close()
+            return False
+        self.trava = trava
+        return True
+
+    def publicar(self):
+        """Grava os resultados em 'arquivo' (troca atômica) para os outros workers."""
+        if not self.arquivo:
+            return
+        with self.lock:
+            dados = {
+                "versao": self.versao,
+                "rodadas": self.rodadas,
+                "duracao_ultima_rodada": self.duracao_ultima_rodada,
+                "estados": {url: estado.para_lista() for url, estado in self.estados.items()},
+            }
+        temporario = f"{self.arquivo}.{os.getpid()}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(dados, f, separators=(',', ':'))
+        os.replace(temporario, self.arquivo)
+        self.assinatura_arquivo = file_signature(self.arquivo)
+
+    def carregar(self):
+        """Relê 'arquivo' se ele mudou desde a última leitura (resultados publicados por quem sonda)."""
+        assinatura = file_signature(self.arquivo) if self.arquivo else None
+        if assinatura is None or assinatura == self.assinatura_arquivo:
+            return
+        with open(self.arquivo, 'r', encoding='utf-8') as f:
+            dados = json.load(f)
+        estados = {url: EstadoLink.de_lista(valores) for url, valores in dados['estados'].items()}
+        with self.lock:
+            self.estados = estados
+            self.versao = dados['versao']
+            self.rodadas = dados['rodadas']
+            self.duracao_ultima_rodada = dados['duracao_ultima_rodada']
+        self.assinatura_arquivo = assinatura
+
+    def iniciar(self):
+        """
+        Sobe a thread da sonda (uma vez por processo, se SONDA_INTERVALO > 0): o
+        processo que assume a trava faz as rodadas; os demais só releem o arquivo.
+        """
+        if self.thread is not None or not self.intervalo:
+            return
+        with self.lock:
+            if self.thread is not None:
+                return
+            def loop():
+                while True:
+                    espera = min(self.intervalo, SONDA_LEITURA)
+                    try:
+                        if self.assumir():
+                            # Quem acaba de assumir parte dos resultados já publicados
+                            if not self.sondando:
+                                self.sondando = True
+                                self.carregar()
+                            self.rodada()
+                            self.publicar()
+                            espera = self.intervalo
+                        else:
+                            self.carregar()
+                    except Exception as e:
+                        print(f"AVISO: Rodada da sonda de links falhou: {e}")
+                    time.sleep(espera)
+            self.thread = threading.Thread(target=loop, daemon=True)
+            self.thread.start()
+
+    def stats(self) -> dict:
+        agora = time.time()
+        with self.lock:
+            validos = [estado for estado in self.estados.values() if agora - estado.verificado_em <= self.validade]
+            total = len(self.estados)
+        mortos = [estado for estado in validos if not estado.vivo]
+        divergentes = [estado for estado in validos if estado.tipo_confere is False]
+        return {
+            "links": total,
+            "vivos": len(validos) - len(mortos),
+            "mortos": len(mortos),
+            "desconhecidos": total - len(validos),
+            "tipo_divergente": len(divergentes),
+            "exemplos_mortos": [estado.filme_id for estado in mortos[:SONDA_EXEMPLOS_MAX]],
+            "exemplos_tipo_divergente": [estado.filme_id for estado in divergentes[:SONDA_EXEMPLOS_MAX]],
+            "rodadas": self.rodadas,
+            "duracao_ultima_rodada": round(self.duracao_ultima_rodada, 3) if self.duracao_ultima_rodada else None,
+            "sondando_neste_processo": self.sondando,
+        }
+
+SONDA = SondaLinks()
+
+@app.before_request
+def start_link_prober():
+    SONDA.iniciar()
+
+def live_filter_requested() -> bool:
+    """O cliente pediu '?vivos=1': tirar das listas os filmes cujo link a sonda viu falhar."""
+    return request.args.get('vivos') == '1'
 
-    payload = url_sensivel
-    temp_token = signer.dumps(payload)
-    
-    base_url = request.url_root.rstrip('/')
-    link_temporario = f"{base_url}/player_proxy/{filme_id}?temp_token={temp_token}"
-    
-    # Resposta encapsulada em uma lista []
-    resposta_player = [{
-        "status": "sucesso",
-        "filme": filme_encontrado['titulo'],
-        "link_temporario": link_temporario, 
-        "expira_em_segundos": TEMPO_EXPIRACAO_LINK
-    }]
-    
-    return jsonify(resposta_player) 
-    
 # --- ROTA DE PROXY (MANTIDA) ---
 
-@app.route('/player_proxy/<int:filme_id>', methods=['GET'])
+@app.route('/player_proxy/<int:filme_id>', methods=['GET', 'HEAD'])
 def player_proxy(filme_id):
-    """Valida o token e serve o stream de mídia (máscara de URL)."""
-    temp_token = request.args.get('temp_token')
+    """
+    Valida o token e serve o stream de mídia (máscara de URL). Range, If-Range
+    e HEAD são repassados à origem; 206, Content-Range, Accept-Ranges e
+    Content-Length voltam como vieram. O corpo é repassado cru (sem
+    decodificar gzip etc.) em blocos de PROXY_CHUNK_SIZE. Playlists HLS são
+    reescritas para que variantes e segmentos também passem pelo proxy.
+    """
+    return proxy_media(filme_id)
+
+@app.route('/player_proxy/<int:filme_id>/hls/<string:recurso>', methods=['GET', 'HEAD'])
+def player_proxy_hls(filme_id, recurso):
+    """Variantes, segmentos e chaves referenciados por uma playlist HLS reescrita."""
+    return proxy_media(filme_id, recurso)
+
+def validate_media_access(filme_id: int, temp_token: str, recurso: str = None) -> tuple:
+    """
+    Valida o temp_token (e o recurso HLS cifrado, se houver) para o filme.
+    Devolve (url_destino, None) ou (None, (status, corpo_do_erro)). Usada
+    pelo proxy Flask e pelo motor assíncrono (proxy_async.py).
+    """
     if not temp_token:
-        return jsonify({"erro": "Acesso negado. Token temporário ausente."}), 401
+        return None, (401, {"erro": "Acesso negado. Token temporário ausente."})
         
     try:
-        url_original = signer.loads(temp_token, max_age=TEMPO_EXPIRACAO_LINK)
+        token = verify_temp_token(temp_token)
+    except SignatureExpired:
+        return None, (401, {"erro": "Acesso negado. O link expirou (4 horas)."})
+    except BadSignature:
+        return None, (401, {"erro": "Acesso negado. O token é inválido ou foi adulterado."})
 
-        try:
-             filme_real = FILMES[filme_id]
-             if url_original != filme_real.get('url_m3u8_ou_mp4'):
-                 return jsonify({"erro": "Token válido, mas ID do filme incorreto ou URL de mídia alterada."}), 401
-        except IndexError:
-             return jsonify({"erro": "ID de filme no proxy inválido."}), 404
-             
-        headers = {key: value for (key, value) in request.headers if key != 'Host'}
-        
-        resp = requests.request(
-            method=request.method,
-            url=url_original,
-            headers=headers,
-            data=request.get_data(),
-            stream=True, 
-            allow_redirects=False
-        )
-        
-        excluded_headers = ['content-encoding', 'content-length', 'transfer-encoding', 'connection']
-        
-        response_headers = [(name, value) for name, value in resp.raw.headers.items()
-                            if name.lower() not in excluded_headers]
-                            
-        return Response(
-            resp.iter_content(chunk_size=1024), 
-            status=resp.status_code,
-            headers=response_headers,
-            content_type=resp.headers.get('Content-Type')
-        )
+    snap = current_snapshot()
+    validado = token.validado
+    if validado is not None and validado[0] == snap.versao and validado[1] == filme_id:
+        url_original = validado[2]
+    else:
+        registro = snap.registro_por_id(filme_id)
+        if registro is None:
+            return None, (404, {"erro": "ID de filme no proxy inválido."})
+        url_original = registro.original.get('url_m3u8_ou_mp4')
+        if not token.confere(filme_id, url_original):
+            return None, (401, {"erro": "Token válido, mas ID do filme incorreto ou URL de mídia alterada."})
+        token.validado = (snap.versao, filme_id, url_original)
 
-    except SignatureExpired:
-        return jsonify({"erro": "Acesso negado. O link expirou (4 horas)."}), 401
-    except BadTimeSignature:
-        return jsonify({"erro": "Acesso negado. O token é inválido ou foi adulterado."}), 401
+    if recurso is None:
+        return url_original, None
+
+    try:
+        filme_recurso, url_destino = hls_cifra.loads(recurso)
+    except (BadSignature, ValueError, TypeError):
+        return None, (401, {"erro": "Acesso negado. Recurso HLS inválido ou adulterado."})
+    if filme_recurso != filme_id:
+        return None, (401, {"erro": "Acesso negado. Recurso HLS de outro filme."})
+    return url_destino, None
+
+MENSAGEM_LIMITE_STREAMS = "Limite de streams simultâneos do token de API atingido. Tente novamente mais tarde."
+
+def open_media_stream(temp_token: str):
+    """Abre um stream no limite do token de API que emitiu o temp_token (já validado); None se ele está no teto."""
+    return LIMITADOR.abrir_stream(verify_temp_token(temp_token).id_token)
+
+def proxy_media(filme_id: int, recurso: str = None):
+    """Valida o acesso e repassa a mídia da origem."""
+    temp_token = request.args.get('temp_token')
+    url_destino, erro = validate_media_access(filme_id, temp_token, recurso)
+    if erro:
+        status, corpo = erro
+        return jsonify(corpo), status
+
+    fechar_stream = open_media_stream(temp_token)
+    if fechar_stream is None:
+        return too_many_requests(LIMITE_STREAMS_RETRY_AFTER, MENSAGEM_LIMITE_STREAMS)
+
+    try:
+        resposta = app.make_response(serve_upstream(filme_id, url_destino, temp_token))
     except requests.exceptions.RequestException as e:
-         return jsonify({"erro": f"Erro ao conectar com a fonte de mídia: {str(e)}"}), 503
+         resposta = app.make_response((jsonify({"erro": f"Erro ao conectar com a fonte de mídia: {str(e)}"}), 503))
     except Exception as e:
-        return jsonify({"erro": f"Erro interno ao validar o link: {str(e)}"}), 500
+        resposta = app.make_response((jsonify({"erro": f"Erro interno ao validar o link: {str(e)}"}), 500))
+    # O stream conta no limite do token até o cliente terminar (ou desconectar)
+    resposta.call_on_close(fechar_stream)
+    return resposta
 
 # --- ROTA DE DOCUMENTAÇÃO ---
 
@@ -422,6 +3215,10 @@ DOCUMENTATION_HTML = """
         <div class="section">
             <h2>🗺️ Endpoints de Listagem e Busca</h2>
             <p>Em caso de sucesso (200 OK), estas rotas retornam um <strong>Array JSON</strong> (<code>[...]</code>) de objetos Filme.</p>
+            <p><strong>Paginação e campos:</strong> todas as listas aceitam <code>?limit=N</code>, <code>?offset=N</code> (ou <code>?cursor=...</code>, recebido no header <code>X-Next-Cursor</code>) e <code>?fields=titulo,url_capa,filme_id</code>. O total de resultados vem no header <code>X-Total-Count</code>.</p>
+            <p>Adicione <code>?stream=1</code> para receber listas grandes em streaming (transferência <em>chunked</em>), com o mesmo conteúdo.</p>
+            <p>Com <code>?vivos=1</code>, as listas deixam de fora os filmes cujo link de mídia a sonda de saúde encontrou fora do ar.</p>
+            <p><strong>Limites:</strong> cada token de API pode ter um limite de requisições por segundo e de streams simultâneos no proxy. Acima dele a resposta é <code>429</code>, com o header <code>Retry-After</code> (segundos).</p>
 
             <table>
                 <thead>
@@ -442,8 +3239,8 @@ DOCUMENTATION_HTML = """
                     <tr>
                         <td><span class="method get">GET</span></td>
                         <td><span class="path">/categorias</span></td>
-                        <td>Lista todas as categorias/gêneros (Retorna Array de Objetos <code>[{"cat": ...}]</code>).</td>
-                        <td>Nenhum</td>
+                        <td>Lista todas as categorias/gêneros (Retorna Array de Objetos <code>[{"cat": ...}]</code>). Com <code>?counts=1</code> inclui <code>"total"</code> de filmes e com <code>?sample=N</code> (até 20) os IDs dos mais assistidos em <code>"amostra"</code>.</td>
+                        <td>Opcional: <code>counts</code>, <code>sample</code></td>
                     </tr>
                     <tr>
                         <td><span class="method get">GET</span></td>
@@ -454,8 +3251,8 @@ DOCUMENTATION_HTML = """
                     <tr>
                         <td><span class="method get">GET</span></td>
                         <td><span class="path">/titulo/{titulo_busca}</span></td>
-                        <td>Busca filmes por título (parcial ou completo).</td>
-                        <td>Título (string)</td>
+                        <td>Busca filmes por título (parcial ou completo), ordenados por relevância (exato &gt; início &gt; palavra &gt; trecho) e popularidade.</td>
+                        <td>Título (string). Opcional: <code>?limit=N</code></td>
                     </tr>
                     <tr>
                         <td><span class="method get">GET</span></td>
@@ -463,6 +3260,30 @@ DOCUMENTATION_HTML = """
                         <td>Filtra filmes por ano de lançamento. Ex: <code>/ano/2025</code></td>
                         <td>Ano (string)</td>
                     </tr>
+                    <tr>
+                        <td><span class="method get">GET</span></td>
+                        <td><span class="path">/filme/{filme_id}</span></td>
+                        <td>Filme pelo ID (retorna o objeto direto, com <code>ETag</code>). O <code>filme_id</code> vem do conteúdo do filme e não muda entre atualizações do catálogo.</td>
+                        <td>ID (inteiro)</td>
+                    </tr>
+                    <tr>
+                        <td><span class="method post">POST</span></td>
+                        <td><span class="path">/lote</span></td>
+                        <td>Consulta em lote: corpo JSON <code>{"ids": [...], "titulos": [...], "player": true}</code> (até 100 itens). Retorna um item por entrada com o filme, o link temporário (se <code>player</code>) ou o <code>erro</code> daquele item.</td>
+                        <td>Corpo JSON</td>
+                    </tr>
+                    <tr>
+                        <td><span class="method get">GET</span></td>
+                        <td><span class="path">/top/{criterio}[/{genero}]</span></td>
+                        <td>Mais assistidos (<code>views</code>) ou mais bem avaliados (<code>imdb</code>), no catálogo todo ou em um gênero. Use <code>?limit=N</code> para o top-N. Ex: <code>/top/imdb/terror?limit=10</code></td>
+                        <td>Critério e gênero (string)</td>
+                    </tr>
+                    <tr>
+                        <td><span class="method get">GET</span></td>
+                        <td><span class="path">/busca</span></td>
+                        <td>Busca combinada: cruza <code>genero</code>, <code>ano</code>, <code>tipo</code> e <code>classificacao</code> e, opcionalmente, o título (<code>q</code>, ordenado por relevância). Ex: <code>/busca?genero=terror&amp;ano=2024</code></td>
+                        <td>Query string (ao menos um filtro)</td>
+                    </tr>
                 </tbody>
             </table>
         </div>
@@ -490,9 +3311,15 @@ DOCUMENTATION_HTML = """
                     <tr>
                         <td><span class="method get">GET</span></td>
                         <td><span class="path">/player_proxy/{filme_id}</span></td>
-                        <td><strong>Proxy de Mídia.</strong> Endpoint final acessado pelo player, que valida o <code>temp_token</code>.</td>
+                        <td><strong>Proxy de Mídia.</strong> Endpoint final acessado pelo player, que valida o <code>temp_token</code>. Aceita <code>HEAD</code> e requisições parciais (<code>Range</code>/<code>If-Range</code>, resposta <code>206</code>).</td>
                         <td>Fluxo de Mídia (MP4/M3U8)</td>
                     </tr>
+                    <tr>
+                        <td><span class="method get">GET</span></td>
+                        <td><span class="path">/player_proxy/{filme_id}/hls/{recurso}</span></td>
+                        <td>Variantes, segmentos e chaves de playlists HLS. As URIs das playlists servidas pelo proxy já apontam para cá (cifradas, com o mesmo <code>temp_token</code>).</td>
+                        <td>Playlist reescrita ou segmento</td>
+                    </tr>
                 </tbody>
             </table>
         </div>
@@ -0,0 +1,62 @@
+"""
+Compara o tempo até a primeira resposta (import do módulo + primeira
+requisição) com o catálogo em JSON e no snapshot binário (mmap).
+
+Uso (no diretório com filmes_capturados.json e api_tokens.json):
+    python benchmarks/bench_cold_start.py [--repeticoes 5]
+
+Gera o filmes_capturados.bin se ele não existir. Imprime uma linha JSON por formato.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executado num processo novo para medir um cold start de verdade
+PRIMEIRA_RESPOSTA = """
+import time
+inicio = time.perf_counter()
+import api_filmes
+carregado = time.perf_counter()
+token = next(iter(api_filmes.VALID_TOKENS), '')
+resp = api_filmes.app.test_client().get('/titulo/a?limit=1', headers={'Authorization': 'Bearer ' + token})
+fim = time.perf_counter()
+print(carregado - inicio, fim - inicio, resp.status_code)
+"""
+
+
+def medir(formato: str, repeticoes: int) -> dict:
+    env = dict(os.environ, CATALOGO_FORMATO=formato, PYTHONPATH=RAIZ)
+    cargas, primeiras = [], []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, '-c', PRIMEIRA_RESPOSTA], env=env,
+                               capture_output=True, text=True, check=True).stdout.split()
+        cargas.append(float(saida[-3]))
+        primeiras.append(float(saida[-2]))
+    return {
+        'formato': formato,
+        'repeticoes': repeticoes,
+        'import_ms_p50': round(statistics.median(cargas) * 1000, 2),
+        'primeira_resposta_ms_p50': round(statistics.median(primeiras) * 1000, 2),
+        'primeira_resposta_ms_min': round(min(primeiras) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    args = parser.parse_args()
+
+    if not os.path.exists('filmes_capturados.bin'):
+        subprocess.run([sys.executable, os.path.join(RAIZ, 'build_snapshot.py')], check=True)
+
+    for formato in ('json', 'bin'):
+        print(json.dumps(medir(formato, args.repeticoes)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Memória por worker sob gunicorn (gunicorn.conf.py) com 1, 4 e 16 workers:
+RSS, PSS e Private_Dirty (de /proc/<pid>/smaps_rollup) de cada worker depois
+de uma carga que passa pelas rotas de listagem e busca.
+
+Cenários:
+    sem_preload   cada worker carrega o próprio catálogo (JSON)
+    preload_json  catálogo carregado no master + gc.freeze antes do fork
+    preload_bin   idem, a partir do snapshot binário (mmap)
+
+Uso (Linux, no diretório com filmes_capturados.json e api_tokens.json):
+    python benchmarks/bench_memoria_workers.py [--workers 1 4 16] [--requisicoes 40]
+
+Requer o gunicorn (requirements-prod.txt). Gera o filmes_capturados.bin se
+ele não existir. Imprime uma linha JSON por (cenário, workers).
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CENARIOS = {
+    'sem_preload': {'GUNICORN_PRELOAD': '0', 'CATALOGO_FORMATO': 'json'},
+    'preload_json': {'GUNICORN_PRELOAD': '1', 'CATALOGO_FORMATO': 'json'},
+    'preload_bin': {'GUNICORN_PRELOAD': '1', 'CATALOGO_FORMATO': 'bin'},
+}
+
+# Rotas exercitadas em cada worker (o catálogo inteiro passa por '/')
+ROTAS = ['/', '/?stream=1', '/categorias?counts=1', '/titulo/a?limit=20', '/top/views?limit=50', '/busca?q=de']
+
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def memoria(pid: int) -> dict:
+    """Campos de /proc/<pid>/smaps_rollup, em KiB."""
+    campos = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for linha in f:
+            partes = linha.split()
+            if len(partes) == 3 and partes[2] == 'kB':
+                campos[partes[0].rstrip(':')] = int(partes[1])
+    return campos
+
+
+def filhos(pid: int) -> list:
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(p) for p in f.read().split()]
+
+
+def medir(cenario: str, workers: int, requisicoes: int, token: str) -> dict:
+    porta = porta_livre()
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), GUNICORN_BIND=f'127.0.0.1:{porta}',
+               GUNICORN_THREADS='4', PYTHONPATH=RAIZ, **CENARIOS[cenario])
+    master = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(RAIZ, 'gunicorn.conf.py'),
+         '--log-level', 'warning', 'api_filmes:app'],
+        env=env,
+    )
+    try:
+        base = f'http://127.0.0.1:{porta}'
+        cabecalhos = {'Authorization': f'Bearer {token}'}
+        limite = time.monotonic() + 300
+        while len(filhos(master.pid)) < workers or not _pronto(base):
+            if time.monotonic() > limite or master.poll() is not None:
+                raise RuntimeError(f"gunicorn não subiu ({cenario}, {workers} workers)")
+            time.sleep(0.2)
+
+        # Conexões novas a cada requisição, para a carga se espalhar pelos workers
+        def requisitar(i):
+            return requests.get(base + ROTAS[i % len(ROTAS)], headers=cabecalhos, timeout=120).status_code
+
+        with ThreadPoolExecutor(max_workers=min(32, workers * 4)) as executor:
+            status = list(executor.map(requisitar, range(requisicoes * workers)))
+
+        pids = filhos(master.pid)
+        por_worker = [memoria(pid) for pid in pids]
+        mestre = memoria(master.pid)
+        n = len(por_worker)
+        return {
+            'cenario': cenario,
+            'workers': n,
+            'respostas_ok': sum(1 for s in status if s == 200),
+            'master_rss_mib': round(mestre['Rss'] / 1024, 1),
+            'worker_rss_mib': round(sum(m['Rss'] for m in por_worker) / n / 1024, 1),
+            'worker_pss_mib': round(sum(m['Pss'] for m in por_worker) / n / 1024, 1),
+            'worker_private_dirty_mib': round(sum(m['Private_Dirty'] for m in por_worker) / n / 1024, 1),
+            'total_pss_mib': round((mestre['Pss'] + sum(m['Pss'] for m in por_worker)) / 1024, 1),
+        }
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait(timeout=60)
+
+
+def _pronto(base: str) -> bool:
+    try:
+        return requests.get(base + '/docs', timeout=5).status_code == 200
+    except requests.exceptions.RequestException:
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requisicoes', type=int, default=40, help='requisições por worker')
+    parser.add_argument('--cenarios', nargs='+', default=list(CENARIOS), choices=list(CENARIOS))
+    args = parser.parse_args()
+
+    if not os.path.exists('filmes_capturados.bin'):
+        subprocess.run([sys.executable, os.path.join(RAIZ, 'build_snapshot.py')], check=True)
+    with open('api_tokens.json', encoding='utf-8') as f:
+        token = next(iter(json.load(f).get('valid_tokens', [])), '')
+
+    for cenario in args.cenarios:
+        for workers in args.workers:
+            print(json.dumps(medir(cenario, workers, args.requisicoes, token)), flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Teste de carga: streams simultâneos por processo no /player_proxy, com o app
+Flask síncrono (pool fixo de workers, como um servidor pre-fork/threads) e
+com o motor assíncrono do proxy_async.py (uvicorn, um processo).
+
+Cada stream lê um vídeo "lento" da origem local (~1 MiB em ~0,8 s). Durante a
+carga mede-se também a latência de GET /categorias, para ver se as rotas de
+catálogo ficam sem worker.
+
+Uso:
+    python benchmarks/bench_proxy_concorrencia.py [--workers 8] [--streams 8 32 128]
+
+Requer as dependências de requirements-async.txt. Imprime uma linha JSON por
+(motor, quantidade de streams).
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import uvicorn
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from benchmarks.origem_local import iniciar_origem, url_base  # noqa: E402
+
+
+class ServidorPoolFixo(BaseWSGIServer):
+    """Servidor WSGI com no máximo 'workers' requisições em atendimento ao mesmo tempo."""
+
+    def __init__(self, host, port, app, workers: int):
+        super().__init__(host, port, app, handler=WSGIRequestHandler)
+        self.request_queue_size = 1024
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._atender, request, client_address)
+
+    def _atender(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def preparar_catalogo(url_midia: str):
+    diretorio = tempfile.mkdtemp(prefix='bench_concorrencia_')
+    filme = {"titulo": "Bench", "ano": "2024", "generos": "Teste", "views": "1",
+             "url_m3u8_ou_mp4": url_midia}
+    with open(os.path.join(diretorio, 'filmes_capturados.json'), 'w', encoding='utf-8') as f:
+        json.dump({"filmes": [filme], "categorias_capturadas": ["Teste"]}, f)
+    with open(os.path.join(diretorio, 'api_tokens.json'), 'w', encoding='utf-8') as f:
+        json.dump({"valid_tokens": ["bench"]}, f)
+    os.chdir(diretorio)
+
+
+def subir_flask(app, workers: int) -> tuple:
+    servidor = ServidorPoolFixo('127.0.0.1', 0, app, workers)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{servidor.server_port}", servidor.shutdown
+
+
+def subir_async(app_asgi) -> tuple:
+    servidor = uvicorn.Server(uvicorn.Config(app_asgi, host='127.0.0.1', port=0, log_level='warning'))
+    threading.Thread(target=servidor.run, daemon=True).start()
+    while not servidor.started:
+        time.sleep(0.05)
+    porta = servidor.servers[0].sockets[0].getsockname()[1]
+
+    def parar():
+        servidor.should_exit = True
+    return f"http://127.0.0.1:{porta}", parar
+
+
+def percentil(valores: list, p: float) -> float:
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+async def carga(base: str, url_stream: str, streams: int) -> dict:
+    limites = httpx.Limits(max_connections=None, max_keepalive_connections=0)
+    async with httpx.AsyncClient(timeout=120, limits=limites) as cliente:
+        async def um_stream():
+            inicio = time.perf_counter()
+            ttfb = None
+            recebidos = 0
+            async with cliente.stream('GET', url_stream) as resp:
+                async for bloco in resp.aiter_raw():
+                    if ttfb is None:
+                        ttfb = time.perf_counter() - inicio
+                    recebidos += len(bloco)
+            return resp.status_code == 200, ttfb or 0.0, time.perf_counter() - inicio, recebidos
+
+        async def catalogo():
+            await asyncio.sleep(0.2)
+            latencias = []
+            for _ in range(5):
+                inicio = time.perf_counter()
+                await cliente.get(f"{base}/categorias", headers={'Authorization': 'Bearer bench'})
+                latencias.append(time.perf_counter() - inicio)
+            return latencias
+
+        inicio = time.perf_counter()
+        resultados, latencias = await asyncio.gather(
+            asyncio.gather(*(um_stream() for _ in range(streams))), catalogo())
+        total = time.perf_counter() - inicio
+
+    duracoes = [r[2] for r in resultados]
+    return {
+        'streams_ok': sum(1 for r in resultados if r[0]),
+        'tempo_total_s': round(total, 2),
+        'ttfb_ms_p50': round(percentil([r[1] for r in resultados], 50) * 1000, 1),
+        'ttfb_ms_p99': round(percentil([r[1] for r in resultados], 99) * 1000, 1),
+        'stream_s_p50': round(statistics.median(duracoes), 2),
+        'stream_s_p99': round(percentil(duracoes, 99), 2),
+        'categorias_ms_p50': round(statistics.median(latencias) * 1000, 1),
+        'categorias_ms_max': round(max(latencias) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=8, help='workers do servidor Flask síncrono')
+    parser.add_argument('--streams', type=int, nargs='+', default=[8, 32, 128])
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    origem = iniciar_origem()
+    url_midia = f"{url_base(origem)}/lento.mp4"
+    preparar_catalogo(url_midia)
+    os.environ['CATALOGO_FORMATO'] = 'json'
+    import api_filmes
+    import proxy_async
+
+    # Sem cache de mídia: cada stream precisa mesmo ir à origem
+    api_filmes.CACHE_MIDIA_MAX_OBJETO = 0
+    filme_id = api_filmes.SNAPSHOT.registros[0].filme_id
+    caminho = f"/player_proxy/{filme_id}?temp_token={api_filmes.create_temp_token(filme_id, url_midia)}"
+
+    for motor, subir in (('flask_sync', lambda: subir_flask(api_filmes.app, args.workers)),
+                         ('asgi_async', lambda: subir_async(proxy_async.app))):
+        base, parar = subir()
+        for streams in args.streams:
+            resultado = asyncio.run(carga(base, base + caminho, streams))
+            print(json.dumps({'motor': motor, 'workers': args.workers if motor == 'flask_sync' else 1,
+                              'streams': streams, **resultado}))
+        parar()
+
+    origem.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Vazão do /player_proxy contra uma origem local, para vários tamanhos de
+bloco (PROXY_CHUNK_SIZE), com download completo e com requisições Range.
+
+Uso:
+    python benchmarks/bench_proxy_throughput.py [--tamanho-mb 64] [--repeticoes 3]
+
+Roda num diretório temporário com um catálogo de um filme só, apontando
+para a origem local. Imprime uma linha JSON por tamanho de bloco.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from werkzeug.serving import make_server
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from benchmarks.origem_local import iniciar_origem, url_base  # noqa: E402
+
+BLOCOS = (1024, 64 * 1024, 256 * 1024, 1024 * 1024)
+
+
+def preparar_catalogo(url_midia: str):
+    """Cria os arquivos de dados mínimos e entra no diretório temporário."""
+    diretorio = tempfile.mkdtemp(prefix='bench_proxy_')
+    filme = {"titulo": "Bench", "ano": "2024", "generos": "Teste", "views": "1",
+             "url_m3u8_ou_mp4": url_midia}
+    with open(os.path.join(diretorio, 'filmes_capturados.json'), 'w', encoding='utf-8') as f:
+        json.dump({"filmes": [filme], "categorias_capturadas": ["Teste"]}, f)
+    with open(os.path.join(diretorio, 'api_tokens.json'), 'w', encoding='utf-8') as f:
+        json.dump({"valid_tokens": ["bench"]}, f)
+    os.chdir(diretorio)
+
+
+def baixar(url: str, headers: dict = None) -> int:
+    total = 0
+    with requests.get(url, headers=headers, stream=True) as resp:
+        resp.raise_for_status()
+        for bloco in resp.iter_content(1024 * 1024):
+            total += len(bloco)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanho-mb', type=int, default=64)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    origem = iniciar_origem(args.tamanho_mb * 1024 * 1024)
+    url_midia = f"{url_base(origem)}/video.mp4"
+    preparar_catalogo(url_midia)
+    os.environ['CATALOGO_FORMATO'] = 'json'
+    import api_filmes
+
+    # Sem cache de mídia: cada download e cada Range precisam mesmo ir à origem
+    api_filmes.CACHE_MIDIA_MAX_OBJETO = 0
+    servidor = make_server('127.0.0.1', 0, api_filmes.app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    filme_id = api_filmes.SNAPSHOT.registros[0].filme_id
+    token = api_filmes.create_temp_token(filme_id, url_midia)
+    url_proxy = f"http://127.0.0.1:{servidor.server_port}/player_proxy/{filme_id}?temp_token={token}"
+
+    for bloco in BLOCOS:
+        api_filmes.PROXY_CHUNK_SIZE = bloco
+        tempos = []
+        for _ in range(args.repeticoes):
+            inicio = time.perf_counter()
+            recebidos = baixar(url_proxy)
+            tempos.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        for i in range(50):
+            baixar(url_proxy, {'Range': f'bytes={i * 65536}-{i * 65536 + 65535}'})
+        tempo_ranges = time.perf_counter() - inicio
+
+        print(json.dumps({
+            'chunk_size': bloco,
+            'bytes': recebidos,
+            'mb_por_s': round(recebidos / min(tempos) / 1e6, 1),
+            'range_64k_ms_medio': round(tempo_ranges / 50 * 1000, 2),
+        }))
+
+    servidor.shutdown()
+    origem.shutdown()
+
+
+if __name__ == '__main__':
+    main()
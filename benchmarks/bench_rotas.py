@@ -0,0 +1,332 @@
+"""
+Suíte de benchmarks das rotas da API sobre catálogos sintéticos
+(benchmarks/gerar_catalogo.py) de 1 mil a 1 milhão de filmes. Para cada
+tamanho, num processo novo:
+
+- cold start: import do módulo + primeira requisição;
+- cada rota (listagens, filtros, busca, /top, /lote, player, /metrics...)
+  pelo test client do Flask e por um servidor WSGI real (werkzeug, com
+  threads): requisições/s, p50, p99 e a primeira requisição (cache frio);
+- mídia pelo /player_proxy a partir da origem local (MP4 inteiro, Range e
+  HLS: master, variante e segmento);
+- pico de memória do processo (ru_maxrss) depois da carga e ao final.
+
+Uso:
+    python benchmarks/bench_rotas.py [--tamanhos 1000 10000 100000] [--requisicoes 200]
+        [--tempo-max 5] [--formato json] [--saida resultados.json] [--comparar anterior.json]
+
+Imprime uma linha JSON por medição. Com '--saida', grava um JSON com o commit,
+a versão do Python e os parâmetros, para comparar execuções de commits
+diferentes: '--comparar' imprime a razão atual / anterior do p50 e do p99.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from benchmarks.gerar_catalogo import GENEROS, escrever_catalogo  # noqa: E402
+from benchmarks.origem_local import iniciar_origem, url_base  # noqa: E402
+
+TOKEN = 'bench'
+
+
+def percentil(valores: list, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def memoria_pico_mib() -> float:
+    """Pico de RSS do processo (ru_maxrss vem em KiB no Linux)."""
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def medir(requisitar, requisicoes: int, tempo_max: float) -> dict:
+    """Chama 'requisitar' (-> (status, bytes)) até 'requisicoes' vezes ou 'tempo_max' segundos (mínimo 3)."""
+    inicio = time.perf_counter()
+    status, tamanho = requisitar()
+    primeira = time.perf_counter() - inicio
+
+    tempos = []
+    limite = time.perf_counter() + tempo_max
+    while len(tempos) < requisicoes and (len(tempos) < 3 or time.perf_counter() < limite):
+        inicio = time.perf_counter()
+        requisitar()
+        tempos.append(time.perf_counter() - inicio)
+
+    return {
+        'status': status,
+        'bytes': tamanho,
+        'requisicoes': len(tempos),
+        'req_por_s': round(len(tempos) / sum(tempos), 1),
+        'primeira_ms': round(primeira * 1000, 3),
+        'p50_ms': round(percentil(tempos, 50) * 1000, 3),
+        'p99_ms': round(percentil(tempos, 99) * 1000, 3),
+    }
+
+
+# --- CASOS (executados no processo filho, com o catálogo já carregado) ---
+
+def casos_rotas(api) -> list:
+    """(nome, método, caminho, corpo JSON) de cada rota, com parâmetros tirados do catálogo carregado."""
+    registros = api.current_snapshot().registros
+    genero = quote(GENEROS[0])
+    filme = next(r for r in registros if r.original.get('url_m3u8_ou_mp4', 'N/A') != 'N/A')
+    ids = [registros[i].filme_id for i in range(0, len(registros), max(1, len(registros) // 20))][:20]
+    titulos = [registros[i].original['titulo'] for i in range(0, len(registros), max(1, len(registros) // 5))][:5]
+    return [
+        ('lista_completa', 'GET', '/', None),
+        ('lista_stream', 'GET', '/?stream=1', None),
+        ('lista_pagina', 'GET', '/?limit=50&offset=100', None),
+        ('lista_campos', 'GET', '/?limit=50&fields=titulo,ano,views', None),
+        ('categorias', 'GET', '/categorias', None),
+        ('categorias_contagens', 'GET', '/categorias?counts=1&sample=5', None),
+        ('genero', 'GET', f'/{genero}', None),
+        ('genero_pagina', 'GET', f'/{genero}?limit=50', None),
+        ('titulo', 'GET', '/titulo/noite?limit=20', None),
+        ('filme', 'GET', f'/filme/{filme.filme_id}', None),
+        ('ano', 'GET', '/ano/2024?limit=50', None),
+        ('top_views', 'GET', '/top/views?limit=50', None),
+        ('top_imdb_genero', 'GET', f'/top/imdb/{genero}?limit=50', None),
+        ('busca_facetas', 'GET', f'/busca?genero={genero}&ano=2024&tipo=mp4&limit=50', None),
+        ('busca_texto', 'GET', f'/busca?q={quote("vingança")}&limit=20', None),
+        ('player', 'GET', f"/titulo/{quote(filme.original['titulo'])}/player", None),
+        ('lote', 'POST', '/lote', {'ids': ids, 'titulos': titulos, 'player': True}),
+        ('stats_proxy', 'GET', '/stats/proxy', None),
+        ('metrics', 'GET', '/metrics', None),
+        ('docs', 'GET', '/docs', None),
+    ]
+
+
+def link_proxy(api, sufixo_url: str) -> str:
+    """Caminho do /player_proxy do primeiro filme cuja URL de mídia termina o caminho em 'sufixo_url'."""
+    for registro in api.current_snapshot().registros:
+        url = registro.original.get('url_m3u8_ou_mp4', '')
+        if url.split('?', 1)[0].endswith(sufixo_url):
+            return f"/player_proxy/{registro.filme_id}?temp_token={api.create_temp_token(registro.filme_id, url)}"
+    return None
+
+
+def primeira_uri(playlist: bytes) -> str:
+    return next(linha for linha in playlist.decode('utf-8').splitlines() if linha and not linha.startswith('#'))
+
+
+def casos_midia(api, buscar) -> list:
+    """(nome, caminho, cabeçalhos) das mídias; 'buscar(caminho)' devolve o corpo (para seguir o HLS)."""
+    casos = []
+    mp4 = link_proxy(api, '/video.mp4')
+    if mp4:
+        casos += [
+            ('proxy_mp4_completo', mp4, {}),
+            ('proxy_mp4_range_1m', mp4, {'Range': 'bytes=1048576-2097151'}),
+        ]
+    master = link_proxy(api, '/master.m3u8')
+    if master:
+        variante = primeira_uri(buscar(master))
+        segmento = primeira_uri(buscar(variante))
+        casos += [
+            ('proxy_hls_master', master, {}),
+            ('proxy_hls_variante', variante, {}),
+            ('proxy_hls_segmento', segmento, {}),
+        ]
+    return casos
+
+
+def cliente_test_client(api):
+    cliente = api.app.test_client()
+    autorizacao = {'Authorization': f'Bearer {TOKEN}'}
+
+    def requisitar(metodo, caminho, corpo=None, cabecalhos=None):
+        resp = cliente.open(caminho, method=metodo, json=corpo, headers=dict(autorizacao, **(cabecalhos or {})))
+        try:
+            return resp.status_code, len(resp.get_data())
+        finally:
+            resp.close()
+
+    def buscar(caminho):
+        resp = cliente.get(caminho)
+        try:
+            return resp.get_data()
+        finally:
+            resp.close()
+
+    return requisitar, buscar, lambda: None
+
+
+def cliente_wsgi(api):
+    import requests
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    servidor = make_server('127.0.0.1', 0, api.app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{servidor.server_port}"
+    sessao = requests.Session()
+    sessao.headers['Authorization'] = f'Bearer {TOKEN}'
+
+    def requisitar(metodo, caminho, corpo=None, cabecalhos=None):
+        with sessao.request(metodo, base + caminho, json=corpo, headers=cabecalhos, stream=True) as resp:
+            # Bytes como vieram na rede (sem descomprimir no cliente)
+            total = 0
+            for bloco in resp.raw.stream(1024 * 1024, decode_content=False):
+                total += len(bloco)
+            return resp.status_code, total
+
+    def buscar(caminho):
+        return sessao.get(base + caminho).content
+
+    return requisitar, buscar, servidor.shutdown
+
+
+def executar_filho(args) -> dict:
+    """Roda no diretório do catálogo, num processo novo: cold start, rotas e mídia."""
+    inicio = time.perf_counter()
+    import api_filmes as api
+    carregado = time.perf_counter()
+    resp = api.app.test_client().get('/categorias', headers={'Authorization': f'Bearer {TOKEN}'})
+    primeira = time.perf_counter()
+
+    resultado = {
+        'tamanho': len(api.current_snapshot().registros),
+        'formato': args.formato,
+        'cold_start': {
+            'import_ms': round((carregado - inicio) * 1000, 1),
+            'primeira_resposta_ms': round((primeira - inicio) * 1000, 1),
+            'status': resp.status_code,
+        },
+        'memoria': {'pico_apos_carga_mib': memoria_pico_mib()},
+        'medicoes': [],
+    }
+
+    for modo, criar_cliente in (('test_client', cliente_test_client), ('wsgi', cliente_wsgi)):
+        requisitar, buscar, encerrar = criar_cliente(api)
+        try:
+            for nome, metodo, caminho, corpo in casos_rotas(api):
+                medicao = medir(lambda: requisitar(metodo, caminho, corpo), args.requisicoes, args.tempo_max)
+                resultado['medicoes'].append(dict(modo=modo, rota=nome, **medicao))
+            for nome, caminho, cabecalhos in casos_midia(api, buscar):
+                medicao = medir(lambda: requisitar('GET', caminho, None, cabecalhos),
+                                args.requisicoes_midia, args.tempo_max)
+                medicao['mb_por_s'] = round(medicao['bytes'] / (medicao['p50_ms'] / 1000) / 1e6, 1)
+                resultado['medicoes'].append(dict(modo=modo, rota=nome, **medicao))
+        finally:
+            encerrar()
+
+    resultado['memoria']['pico_final_mib'] = memoria_pico_mib()
+    return resultado
+
+
+# --- PROCESSO PRINCIPAL ---
+
+def commit_atual() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def rodar_tamanho(tamanho: int, origem: str, args) -> dict:
+    diretorio = tempfile.mkdtemp(prefix=f'bench_rotas_{tamanho}_')
+    try:
+        inicio = time.perf_counter()
+        escrever_catalogo(os.path.join(diretorio, 'filmes_capturados.json'), tamanho, args.semente, origem)
+        with open(os.path.join(diretorio, 'api_tokens.json'), 'w', encoding='utf-8') as f:
+            json.dump({'valid_tokens': [TOKEN]}, f)
+        if args.formato == 'bin':
+            subprocess.run([sys.executable, os.path.join(RAIZ, 'build_snapshot.py')], cwd=diretorio,
+                           env=dict(os.environ, PYTHONPATH=RAIZ), check=True, capture_output=True)
+        geracao = time.perf_counter() - inicio
+
+        comando = [sys.executable, os.path.abspath(__file__), '--filho', '--formato', args.formato,
+                   '--requisicoes', str(args.requisicoes), '--requisicoes-midia', str(args.requisicoes_midia),
+                   '--tempo-max', str(args.tempo_max)]
+        # O mesmo token também é o de administrador, para medir o /stats/proxy
+        env = dict(os.environ, PYTHONPATH=RAIZ, CATALOGO_FORMATO=args.formato, API_ADMIN_TOKEN=TOKEN)
+        saida = subprocess.run(comando, cwd=diretorio, env=env, capture_output=True, text=True)
+        if saida.returncode != 0:
+            raise RuntimeError(f"benchmark com {tamanho} filmes falhou:\n{saida.stderr}")
+        resultado = json.loads(saida.stdout.splitlines()[-1])
+        resultado['geracao_catalogo_s'] = round(geracao, 2)
+        return resultado
+    finally:
+        shutil.rmtree(diretorio, ignore_errors=True)
+
+
+def comparar(atual: dict, anterior: dict):
+    """Uma linha JSON por medição presente nas duas execuções, com a razão atual / anterior."""
+    def indexar(documento):
+        return {
+            (r['tamanho'], r['formato'], m['modo'], m['rota']): m
+            for r in documento['resultados'] for m in r['medicoes']
+        }
+
+    antes = indexar(anterior)
+    for chave, medicao in indexar(atual).items():
+        if chave not in antes:
+            continue
+        linha = dict(zip(('tamanho', 'formato', 'modo', 'rota'), chave))
+        for campo in ('p50_ms', 'p99_ms'):
+            linha[f'{campo}_anterior'] = antes[chave][campo]
+            linha[campo] = medicao[campo]
+            linha[f'razao_{campo[:3]}'] = round(medicao[campo] / antes[chave][campo], 3) if antes[chave][campo] else None
+        print(json.dumps(linha, ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--requisicoes', type=int, default=200, help='máximo de requisições por rota')
+    parser.add_argument('--requisicoes-midia', type=int, default=20, help='máximo de requisições por mídia')
+    parser.add_argument('--tempo-max', type=float, default=5.0, help='segundos por rota (mínimo de 3 requisições)')
+    parser.add_argument('--tamanho-midia-mb', type=int, default=16, help='tamanho do MP4 da origem local')
+    parser.add_argument('--formato', choices=('json', 'bin'), default='json')
+    parser.add_argument('--semente', type=int, default=1)
+    parser.add_argument('--saida', help='arquivo JSON com todos os resultados')
+    parser.add_argument('--comparar', help='resultados de uma execução anterior (--saida)')
+    parser.add_argument('--filho', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.filho:
+        print(json.dumps(executar_filho(args), ensure_ascii=False))
+        return
+
+    origem = iniciar_origem(args.tamanho_midia_mb * 1024 * 1024)
+    documento = {
+        'commit': commit_atual(),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'data': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'parametros': {chave: valor for chave, valor in vars(args).items() if chave not in ('filho', 'saida', 'comparar')},
+        'resultados': [],
+    }
+    for tamanho in args.tamanhos:
+        resultado = rodar_tamanho(tamanho, url_base(origem), args)
+        documento['resultados'].append(resultado)
+        resumo = {chave: valor for chave, valor in resultado.items() if chave != 'medicoes'}
+        print(json.dumps(resumo, ensure_ascii=False), flush=True)
+        for medicao in resultado['medicoes']:
+            print(json.dumps(dict(tamanho=tamanho, **medicao), ensure_ascii=False), flush=True)
+    origem.shutdown()
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(documento, f, ensure_ascii=False, indent=1)
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            comparar(documento, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Gera um filmes_capturados.json sintético (de 1 mil a 1 milhão de filmes) com
+distribuições parecidas com as do catálogo real: poucos gêneros concentram a
+maior parte dos filmes, anos recentes pesam mais, views seguem uma cauda longa
+e os títulos têm acentos, continuações e remakes (títulos repetidos).
+
+Uso:
+    python benchmarks/gerar_catalogo.py 100000 [--semente 1] [--origem http://127.0.0.1:8000]
+        [--saida filmes_capturados.json]
+
+Com '--origem', as URLs de mídia dos filmes MP4/HLS apontam para a origem local
+(benchmarks/origem_local.py), uma URL distinta por filme. O arquivo é escrito
+filme a filme, sem montar o catálogo inteiro em memória.
+"""
+import argparse
+import json
+import random
+
+# Gêneros em ordem de popularidade (pesos ~ 1/posição, como no catálogo real)
+GENEROS = (
+    'Ação', 'Drama', 'Comédia', 'Terror', 'Suspense', 'Aventura', 'Romance', 'Animação', 'Crime',
+    'Ficção Científica', 'Fantasia', 'Família', 'Documentário', 'Nacional', 'Guerra', 'Mistério',
+    'Lançamentos', 'Faroeste', 'Musical', 'História', 'Esporte', 'Biografia', 'Netflix', 'Anime',
+)
+PESOS_GENEROS = [1 / (i + 1) for i in range(len(GENEROS))]
+
+PALAVRAS = (
+    'Noite', 'Último', 'Coração', 'Vingança', 'Sombras', 'Guerra', 'Amor', 'Perdidos', 'Herói', 'Missão',
+    'Código', 'Ilha', 'Céu', 'Mar', 'Fúria', 'Lágrimas', 'Segredo', 'Destino', 'Império', 'Maldição',
+    'Família', 'Caçador', 'Órfã', 'Estação', 'Jornada', 'Mágico', 'Sertão', 'São Paulo', 'Inverno',
+    'Fantasma', 'Sobrevivência', 'Pânico', 'Paixão', 'Ódio', 'Irmãos', 'Perigosa', 'Veloz', 'Invasão',
+    'Lenda', 'Escuridão', 'Cidade', 'Reino', 'Operação', 'Caçada', 'Espião', 'Memórias', 'Ação', 'Ânsia',
+)
+LIGACOES = ('de', 'da', 'do', 'dos', 'das', 'e', 'no', 'na', 'em', 'sem', 'para', 'contra')
+ARTIGOS = ('O', 'A', 'Os', 'As', '')
+CONTINUACOES = (' 2', ' 3', ': Parte II', ': O Retorno', ': A Origem', ' - O Filme')
+CLASSIFICACOES = ('L', '10', '12', '14', '16', '18')
+PESOS_CLASSIFICACOES = (8, 6, 14, 22, 30, 20)
+
+# Tipo de mídia: (fração dos filmes, modelo da URL)
+MIDIAS = (
+    (0.60, 'mp4'),
+    (0.25, 'm3u8'),
+    (0.05, 'driver'),
+    (0.05, 'm3u'),
+    (0.05, None),
+)
+
+
+def gerar_titulo(rng: random.Random) -> str:
+    palavras = [rng.choice(PALAVRAS)]
+    for _ in range(rng.choices((0, 1, 2, 3), (25, 40, 25, 10))[0]):
+        palavras += [rng.choice(LIGACOES), rng.choice(PALAVRAS)]
+    artigo = rng.choice(ARTIGOS)
+    return (f"{artigo} " if artigo else '') + ' '.join(palavras)
+
+
+def url_midia(rng: random.Random, i: int, origem: str = None):
+    sorteio = rng.random()
+    for fracao, tipo in MIDIAS:
+        if sorteio < fracao:
+            break
+        sorteio -= fracao
+    if tipo is None:
+        return 'N/A'
+    if tipo == 'mp4':
+        return f"{origem}/video.mp4?f={i}" if origem else f"https://cdn.exemplo.com.br/v/{i}.mp4"
+    if tipo == 'm3u8':
+        return f"{origem}/hls/master.m3u8?f={i}" if origem else f"https://cdn.exemplo.com.br/h/{i}/index.m3u8"
+    if tipo == 'driver':
+        return f"https://drive.google.com/file/d/{i:012x}/view"
+    return f"https://iptv.exemplo.com.br/lista/{i}.m3u"
+
+
+def gerar_filme(rng: random.Random, i: int, titulos: list, origem: str = None) -> dict:
+    # Remakes e continuações: ~8% reaproveitam um título anterior
+    if titulos and rng.random() < 0.08:
+        titulo = rng.choice(titulos) + (rng.choice(CONTINUACOES) if rng.random() < 0.7 else '')
+    else:
+        titulo = gerar_titulo(rng)
+        if len(titulos) < 50000:
+            titulos.append(titulo)
+
+    generos = []
+    for _ in range(rng.choices((1, 2, 3), (35, 45, 20))[0]):
+        genero = rng.choices(GENEROS, PESOS_GENEROS)[0]
+        if genero not in generos:
+            generos.append(genero)
+
+    # Anos recentes pesam mais; alguns vêm com espaço sobrando, como no scraping real
+    ano = 2025 - min(int(rng.expovariate(1 / 8)), 60)
+    views = min(int(rng.paretovariate(1.16) * 150), 50_000_000)
+    nota = rng.gauss(6.3, 1.2)
+    sinopse = ' '.join(rng.choice(PALAVRAS + LIGACOES) for _ in range(rng.randint(15, 60))) + '.'
+    sinopse = sinopse[0].upper() + sinopse[1:]
+
+    return {
+        "titulo": titulo,
+        "ano": f"{ano} " if rng.random() < 0.05 else str(ano),
+        "generos": ', '.join(generos),
+        "classificacao": rng.choices(CLASSIFICACOES, PESOS_CLASSIFICACOES)[0],
+        "duracao": f"{rng.randint(1, 2)}h {rng.randint(0, 59)}min",
+        "imdb": f"IMDb{min(max(nota, 1.0), 9.8):.1f}" if rng.random() < 0.9 else 'N/A',
+        "sinopse": sinopse,
+        "url_capa": f"'https://img.exemplo.com.br/capas/{i}.jpg'",
+        "url_poster": f"'https://img.exemplo.com.br/posters/{i}.jpg'",
+        "views": f"{views:,}",
+        "url_m3u8_ou_mp4": url_midia(rng, i, origem),
+        "url_player_pagina": f"https://filmes.exemplo.com.br/assistir/{i}",
+        "url_filme": f"https://filmes.exemplo.com.br/filme/{i}",
+    }
+
+
+def escrever_catalogo(caminho: str, quantidade: int, semente: int = 1, origem: str = None):
+    """Escreve o catálogo sintético em 'caminho' (mesmo formato do filmes_capturados.json)."""
+    rng = random.Random(semente)
+    titulos = []
+    with open(caminho, 'w', encoding='utf-8') as f:
+        f.write('{"filmes": [')
+        for i in range(quantidade):
+            if i:
+                f.write(',\n')
+            f.write(json.dumps(gerar_filme(rng, i, titulos, origem), ensure_ascii=False))
+        f.write('],\n"categorias_capturadas": ')
+        f.write(json.dumps(list(GENEROS), ensure_ascii=False))
+        f.write('}\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('quantidade', type=int)
+    parser.add_argument('--semente', type=int, default=1)
+    parser.add_argument('--origem', help='URL base da origem local (benchmarks/origem_local.py)')
+    parser.add_argument('--saida', default='filmes_capturados.json')
+    args = parser.parse_args()
+    escrever_catalogo(args.saida, args.quantidade, args.semente, args.origem)
+
+
+if __name__ == '__main__':
+    main()
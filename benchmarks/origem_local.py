@@ -0,0 +1,122 @@
+"""
+Origem de mídia local para os benchmarks: serve um "MP4" sintético com
+suporte a Range/HEAD em /video.mp4, uma versão lenta em /lento.mp4 (simula
+uma reprodução longa) e um HLS VOD em /hls/master.m3u8 (duas variantes com
+segmentos .ts), sem depender de rede externa. A query string é ignorada, então
+cada filme de um catálogo sintético pode ter a sua própria URL.
+"""
+import http.server
+import re
+import threading
+import time
+
+# Conteúdo servido (padrão de bytes determinístico)
+TAMANHO_PADRAO = 64 * 1024 * 1024
+# HLS: variantes da master playlist, segmentos por variante e tamanho de cada segmento
+HLS_VARIANTES = (('v0', 800000, '640x360'), ('v1', 2400000, '1280x720'))
+HLS_SEGMENTOS = 10
+HLS_TAMANHO_SEGMENTO = 256 * 1024
+
+_HLS_RECURSO = re.compile(r'^/hls/(?:(v\d+)/)?([\w.]+)$')
+
+
+class OrigemHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.servir(enviar_corpo=False)
+
+    def do_GET(self):
+        if self.path.startswith('/lento'):
+            self.servir_lento()
+        else:
+            self.servir(enviar_corpo=True)
+
+    def servir(self, enviar_corpo: bool):
+        caminho = self.path.split('?', 1)[0]
+        if not caminho.startswith('/hls/'):
+            return self.servir_video(enviar_corpo)
+        recurso = _HLS_RECURSO.match(caminho)
+        if recurso is None:
+            return self.servir_texto(404, 'text/plain', 'nao encontrado\n', enviar_corpo)
+        variante, nome = recurso.groups()
+        if variante is None and nome == 'master.m3u8':
+            linhas = ['#EXTM3U']
+            for nome_variante, banda, resolucao in HLS_VARIANTES:
+                linhas.append(f'#EXT-X-STREAM-INF:BANDWIDTH={banda},RESOLUTION={resolucao}')
+                linhas.append(f'{nome_variante}/index.m3u8')
+            return self.servir_texto(200, 'application/vnd.apple.mpegurl', '\n'.join(linhas) + '\n', enviar_corpo)
+        if variante is not None and nome == 'index.m3u8':
+            linhas = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:6', '#EXT-X-MEDIA-SEQUENCE:0']
+            for i in range(HLS_SEGMENTOS):
+                linhas += ['#EXTINF:6.0,', f'seg{i}.ts']
+            linhas.append('#EXT-X-ENDLIST')
+            return self.servir_texto(200, 'application/vnd.apple.mpegurl', '\n'.join(linhas) + '\n', enviar_corpo)
+        if variante is not None and re.fullmatch(r'seg\d+\.ts', nome):
+            return self.servir_video(enviar_corpo, self.server.dados[:HLS_TAMANHO_SEGMENTO], 'video/mp2t')
+        return self.servir_texto(404, 'text/plain', 'nao encontrado\n', enviar_corpo)
+
+    def servir_texto(self, status: int, content_type: str, texto: str, enviar_corpo: bool):
+        corpo = texto.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        if enviar_corpo:
+            self.wfile.write(corpo)
+
+    def servir_lento(self):
+        """Blocos de 64 KiB com uma pausa entre eles (total: server.tamanho_lento bytes)."""
+        bloco = self.server.dados[:64 * 1024]
+        quantidade = self.server.tamanho_lento // len(bloco)
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', str(quantidade * len(bloco)))
+        self.end_headers()
+        try:
+            for _ in range(quantidade):
+                self.wfile.write(bloco)
+                time.sleep(self.server.atraso_bloco)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def servir_video(self, enviar_corpo: bool, dados: bytes = None, content_type: str = 'video/mp4'):
+        dados = self.server.dados if dados is None else dados
+        inicio, fim, status = 0, len(dados) - 1, 200
+
+        intervalo = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if intervalo:
+            inicio = int(intervalo[1])
+            fim = min(int(intervalo[2]), fim) if intervalo[2] else fim
+            status = 206
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(fim - inicio + 1))
+        if status == 206:
+            self.send_header('Content-Range', f'bytes {inicio}-{fim}/{len(dados)}')
+        self.end_headers()
+
+        if enviar_corpo:
+            self.wfile.write(memoryview(dados)[inicio:fim + 1])
+
+
+def iniciar_origem(tamanho: int = TAMANHO_PADRAO, tamanho_lento: int = 1024 * 1024,
+                   atraso_bloco: float = 0.05) -> http.server.ThreadingHTTPServer:
+    """Sobe a origem numa porta livre de 127.0.0.1, em uma thread daemon."""
+    servidor = http.server.ThreadingHTTPServer(('127.0.0.1', 0), OrigemHandler)
+    servidor.daemon_threads = True
+    servidor.request_queue_size = 1024
+    servidor.dados = bytes(range(256)) * (max(tamanho, 64 * 1024) // 256)
+    servidor.tamanho_lento = tamanho_lento
+    servidor.atraso_bloco = atraso_bloco
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def url_base(servidor) -> str:
+    return f"http://127.0.0.1:{servidor.server_port}"
@@ -0,0 +1,32 @@
+"""
+Gera o snapshot binário do catálogo (filmes_capturados.bin) a partir do
+filmes_capturados.json, para a API abrir com mmap em vez de fazer o parse do
+JSON a cada cold start.
+
+Uso (no diretório dos arquivos de dados):
+    python build_snapshot.py [arquivo_saida]
+"""
+import os
+import sys
+import time
+
+# O build sempre parte do JSON, mesmo que já exista um .bin antigo
+os.environ['CATALOGO_FORMATO'] = 'json'
+
+import api_filmes
+
+
+def main():
+    saida = sys.argv[1] if len(sys.argv) > 1 else api_filmes.BINARY_FILE
+    inicio = time.perf_counter()
+    snap = api_filmes.CatalogoSnapshot(*api_filmes.load_data())
+    if snap.versao == 'vazio':
+        sys.exit(f"ERRO: não foi possível ler {api_filmes.DATA_FILE}.")
+
+    api_filmes.write_binary_snapshot(snap, saida)
+    print(f"{saida}: {len(snap.registros)} filmes, {os.path.getsize(saida)} bytes, "
+          f"versão {snap.versao[:8]} ({time.perf_counter() - inicio:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Configuração de produção do gunicorn (lida automaticamente do diretório atual):
+
+    gunicorn api_filmes:app
+
+O app, e com ele o catálogo, é carregado uma única vez no processo master
+(preload_app) e os workers nascem por fork, herdando as páginas do catálogo
+por copy-on-write. Para que elas continuem compartilhadas:
+
+- o GC fica desligado no master durante a carga (coletas ali deixariam
+  "buracos" espalhados pelas páginas herdadas) e volta a ser ligado em
+  when_ready, logo depois do gc.freeze() (e em on_reload, já que um SIGHUP
+  relê este arquivo); post_fork o liga também em cada worker;
+- gc.freeze() (em when_ready e de novo antes de cada fork) move os objetos do
+  master para a geração permanente, que as coletas dos workers não
+  percorrem (nem escrevem);
+- com o snapshot binário (filmes_capturados.bin) títulos, views, ordens e
+  postings ficam no mmap: páginas do arquivo, compartilhadas e sem refcount.
+  Os registros também ficam lá e cada worker decodifica só os que usa; o
+  aquecimento no master (warm_snapshot) só pré-codifica os fragmentos JSON
+  do catálogo carregado do JSON, cujos registros já são objetos Python.
+  Materializar os registros do mmap no master traria de volta as escritas
+  de refcount (e as cópias de página) que o mmap evita.
+
+Variáveis de ambiente: PORT ou GUNICORN_BIND, WEB_CONCURRENCY (workers),
+GUNICORN_THREADS e GUNICORN_PRELOAD=0 (desliga o preload, para comparação).
+Medição: benchmarks/bench_memoria_workers.py.
+"""
+import gc
+import os
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+# Threads por worker: o proxy de mídia segura uma thread por stream
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+if preload_app:
+    gc.disable()
+
+
+def when_ready(server):
+    """No master, já com o app carregado e antes do primeiro fork."""
+    if preload_app:
+        import api_filmes
+        aquecidos = api_filmes.warm_snapshot()
+        server.log.info("Catálogo pré-carregado no master: %d filmes, %d fragmentos pré-codificados (versão %s)",
+                        len(api_filmes.SNAPSHOT.registros), aquecidos, api_filmes.SNAPSHOT.versao[:8])
+        # O master vive tanto quanto o serviço: congela o que foi carregado e religa o GC
+        gc.freeze()
+        gc.enable()
+
+
+def on_reload(server):
+    """
+    SIGHUP relê este arquivo (e o gc.disable() lá de cima) no master, mas não
+    passa de novo por when_ready: congela o que a recarga criou e religa o GC.
+    """
+    gc.freeze()
+    gc.enable()
+
+
+def pre_fork(server, worker):
+    # Objetos criados no master desde o último fork (ex: antes de repor um worker)
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    # Garantia nos workers, qualquer que seja o estado do GC no master no momento do fork
+    gc.enable()
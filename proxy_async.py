@@ -0,0 +1,256 @@
+"""
+Motor assíncrono (ASGI) do proxy de mídia.
+
+No app Flask cada stream do /player_proxy prende um worker síncrono durante
+toda a reprodução. Aqui /player_proxy/<id> e /player_proxy/<id>/hls/<recurso>
+são servidos com I/O não bloqueante (httpx) e com a backpressure do servidor
+ASGI (cada bloco só é lido da origem depois que o anterior foi entregue ao
+cliente). A validação do temp_token, a filtragem de cabeçalhos, a reescrita de
+playlists HLS e o cache de mídia são os mesmos do api_filmes. Todas as outras
+rotas continuam no app Flask, montado via WsgiToAsgi.
+
+Dependências extras: requirements-async.txt
+Uso:
+    uvicorn proxy_async:app --host 0.0.0.0 --port 8000
+"""
+import asyncio
+import json
+import re
+import time
+from urllib.parse import parse_qs
+
+import httpx
+from asgiref.wsgi import WsgiToAsgi
+
+import api_filmes
+from api_filmes import (
+    CACHE_MIDIA, CACHE_PLAYLISTS, METRICAS, M_UPSTREAM_BYTES, M_UPSTREAM_REQUISICOES, M_UPSTREAM_TTFB,
+    LIMITE_STREAMS_RETRY_AFTER, MENSAGEM_CORPO_INCOMPLETO, MENSAGEM_LIMITE_STREAMS, PlaylistHLS, ObjetoMidia,
+    cacheable_request_headers, filter_request_headers, filter_response_headers, is_cacheable, is_hls_playlist,
+    media_cache_lifetime, open_media_stream, validate_media_access,
+)
+
+ROTA_PROXY = re.compile(r'^/player_proxy/(\d+)(?:/hls/([^/]+))?$')
+_CONDICIONAIS = {nome.lower() for nome in api_filmes.CABECALHOS_CONDICIONAIS}
+
+
+def _cabecalhos_asgi(pares) -> list:
+    return [(nome.lower().encode('latin-1'), str(valor).encode('latin-1')) for nome, valor in pares]
+
+
+class MotorProxyAsync:
+    """App ASGI: proxy de mídia assíncrono na frente do app Flask."""
+
+    def __init__(self, app_wsgi):
+        self.app_wsgi = WsgiToAsgi(app_wsgi)
+        self.cliente = None
+        self.em_andamento = {}
+
+    def _cliente(self) -> httpx.AsyncClient:
+        """Cliente HTTP com pool keep-alive, criado no event loop em uso."""
+        if self.cliente is None:
+            transporte = httpx.AsyncHTTPTransport(
+                retries=api_filmes.UPSTREAM_RETRIES,
+                limits=httpx.Limits(max_connections=None,
+                                    max_keepalive_connections=api_filmes.UPSTREAM_POOL_MAXSIZE),
+            )
+            self.cliente = httpx.AsyncClient(
+                transport=transporte,
+                timeout=httpx.Timeout(api_filmes.UPSTREAM_READ_TIMEOUT, connect=api_filmes.UPSTREAM_CONNECT_TIMEOUT),
+                follow_redirects=False,
+            )
+        return self.cliente
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            rota = ROTA_PROXY.match(scope['path'])
+            if rota:
+                await self.proxy(scope, receive, send, int(rota[1]), rota[2])
+                return
+        await self.app_wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensagem['type'] == 'lifespan.shutdown':
+                if self.cliente is not None:
+                    await self.cliente.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def proxy(self, scope, receive, send, filme_id: int, recurso: str = None):
+        """Mesmo fluxo do proxy_media/serve_upstream do Flask, sem bloquear o event loop."""
+        query = parse_qs(scope['query_string'].decode('latin-1'))
+        temp_token = query.get('temp_token', [None])[0]
+        url, erro = validate_media_access(filme_id, temp_token, recurso)
+        if erro:
+            await self._json(send, *erro)
+            return
+
+        fechar_stream = open_media_stream(temp_token)
+        if fechar_stream is None:
+            await self._json(send, 429, {"erro": MENSAGEM_LIMITE_STREAMS},
+                             [('Retry-After', str(LIMITE_STREAMS_RETRY_AFTER))])
+            return
+        try:
+            await self._atender(scope, receive, send, filme_id, url, temp_token)
+        finally:
+            fechar_stream()
+
+    async def _atender(self, scope, receive, send, filme_id: int, url: str, temp_token: str):
+        """Cache de playlists/mídia, single-flight e busca na origem de uma requisição já admitida."""
+        metodo = scope['method']
+        cabecalhos = [(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope['headers']]
+        prefixo = scope.get('root_path', '')
+        chave_playlist = (filme_id, url, prefixo)
+        chave = None
+        if metodo == 'GET' and not any(k.lower() in _CONDICIONAIS for k, _ in cabecalhos):
+            chave = (url, next((v for k, v in cabecalhos if k.lower() == 'range'), None))
+
+        lider = False
+        while chave is not None:
+            playlist = CACHE_PLAYLISTS.get(chave_playlist)
+            if playlist is not None:
+                await self._playlist(send, playlist, temp_token)
+                return
+            objeto = await asyncio.to_thread(CACHE_MIDIA.get, chave)
+            if objeto is not None:
+                await self._enviar(send, objeto.status, objeto.cabecalhos, objeto.corpo)
+                return
+
+            futuro = self.em_andamento.get(chave)
+            if futuro is None:
+                self.em_andamento[chave] = asyncio.get_running_loop().create_future()
+                lider = True
+                break
+            try:
+                cacheado = await asyncio.wait_for(asyncio.shield(futuro), api_filmes.CACHE_MIDIA_ESPERA)
+            except asyncio.TimeoutError:
+                break
+            if not cacheado:
+                break
+
+        iniciada = False
+
+        async def enviar(mensagem):
+            nonlocal iniciada
+            iniciada = iniciada or mensagem['type'] == 'http.response.start'
+            await send(mensagem)
+
+        cacheado = False
+        try:
+            cacheado = await self._buscar(scope, receive, enviar, filme_id, url, temp_token, cabecalhos,
+                                          prefixo, chave if lider else None)
+        except httpx.HTTPError as e:
+            # Com os cabeçalhos da origem (e seu Content-Length) já enviados não cabe outra resposta:
+            # sair sem completar o corpo faz o servidor fechar a conexão, e o cliente vê o corte
+            if not iniciada:
+                await self._json(send, 503, {"erro": f"Erro ao conectar com a fonte de mídia: {str(e)}"})
+        finally:
+            if lider:
+                self._liberar(chave, cacheado)
+
+    def _liberar(self, chave, cacheado: bool):
+        """Acorda quem espera o fetch de 'chave' (no máximo uma vez)."""
+        futuro = self.em_andamento.pop(chave, None)
+        if futuro is not None and not futuro.done():
+            futuro.set_result(cacheado)
+
+    async def _buscar(self, scope, receive, send, filme_id, url, temp_token, cabecalhos, prefixo, chave) -> bool:
+        """Busca na origem e responde; devolve se algo foi guardado em cache."""
+        metodo = scope['method']
+        cliente = self._cliente()
+        cabecalhos_origem = filter_request_headers(cabecalhos)
+        if chave is not None:
+            cabecalhos_origem = cacheable_request_headers(cabecalhos_origem)
+        requisicao = cliente.build_request(metodo, url, headers=cabecalhos_origem)
+        inicio = time.perf_counter()
+        resp = await cliente.send(requisicao, stream=True)
+        METRICAS.observe(M_UPSTREAM_TTFB, time.perf_counter() - inicio)
+        METRICAS.inc(M_UPSTREAM_REQUISICOES, (('status', str(resp.status_code)),))
+        try:
+            if metodo == 'GET' and resp.status_code == 200 and is_hls_playlist(url, resp):
+                await resp.aread()
+                METRICAS.inc(M_UPSTREAM_BYTES, valor=len(resp.content))
+                playlist = PlaylistHLS(resp.text, url, filme_id, prefixo)
+                CACHE_PLAYLISTS.put((filme_id, url, prefixo), playlist)
+                await self._playlist(send, playlist, temp_token)
+                return True
+
+            cabecalhos_resposta = filter_response_headers(resp.headers.multi_items())
+
+            if chave is not None and is_cacheable(resp):
+                try:
+                    corpo = b''.join([bloco async for bloco in resp.aiter_raw()])
+                except httpx.TransportError:
+                    # Origem caiu no meio do corpo (conexão fechada antes do fim, timeout de leitura...)
+                    corpo = None
+                if corpo is None or len(corpo) != int(resp.headers['Content-Length']):
+                    await self._json(send, 502, {"erro": MENSAGEM_CORPO_INCOMPLETO})
+                    return False
+                METRICAS.inc(M_UPSTREAM_BYTES, valor=len(corpo))
+                objeto = ObjetoMidia(resp.status_code, cabecalhos_resposta, corpo,
+                                     validade=media_cache_lifetime(resp.headers))
+                await asyncio.to_thread(CACHE_MIDIA.put, chave, objeto)
+                await self._enviar(send, objeto.status, objeto.cabecalhos, objeto.corpo)
+                return True
+
+            # Não cacheável: quem espera esta chave vai direto à origem, sem aguardar o stream inteiro
+            if chave is not None:
+                self._liberar(chave, False)
+            await send({'type': 'http.response.start', 'status': resp.status_code,
+                        'headers': _cabecalhos_asgi(cabecalhos_resposta)})
+            if metodo == 'HEAD':
+                await send({'type': 'http.response.body', 'body': b''})
+                return False
+
+            # Repasse com backpressure; para assim que o cliente desconecta
+            repasse = asyncio.ensure_future(self._repassar(resp, send))
+            desconexao = asyncio.ensure_future(self._esperar_desconexao(receive))
+            await asyncio.wait({repasse, desconexao}, return_when=asyncio.FIRST_COMPLETED)
+            for tarefa in (repasse, desconexao):
+                tarefa.cancel()
+            if repasse.done() and not repasse.cancelled() and repasse.exception():
+                raise repasse.exception()
+            return False
+        finally:
+            await resp.aclose()
+
+    @staticmethod
+    async def _repassar(resp: httpx.Response, send):
+        total = 0
+        try:
+            async for bloco in resp.aiter_raw(api_filmes.PROXY_CHUNK_SIZE):
+                total += len(bloco)
+                await send({'type': 'http.response.body', 'body': bloco, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            METRICAS.inc(M_UPSTREAM_BYTES, valor=total)
+
+    @staticmethod
+    async def _esperar_desconexao(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    @staticmethod
+    async def _enviar(send, status: int, cabecalhos: list, corpo: bytes):
+        await send({'type': 'http.response.start', 'status': status, 'headers': _cabecalhos_asgi(cabecalhos)})
+        await send({'type': 'http.response.body', 'body': corpo})
+
+    async def _playlist(self, send, playlist: PlaylistHLS, temp_token: str):
+        corpo = playlist.render(temp_token).encode('utf-8')
+        await self._enviar(send, 200, [('Content-Type', 'application/vnd.apple.mpegurl'),
+                                       ('Content-Length', str(len(corpo)))], corpo)
+
+    async def _json(self, send, status: int, corpo: dict, cabecalhos: list = ()):
+        dados = json.dumps(corpo).encode('utf-8')
+        await self._enviar(send, status, [('Content-Type', 'application/json'),
+                                          ('Content-Length', str(len(dados))), *cabecalhos], dados)
+
+
+app = MotorProxyAsync(api_filmes.app)